@@ -0,0 +1,28 @@
+# crud/aio/bot.py
+
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.bot import Bot
+from uuid import UUID
+from utils.bot_cache import get_cached_bot, cache_bot
+
+async def get_bot(db: AsyncSession, bot_id: UUID):
+    db_bot = (await db.execute(select(Bot).where(Bot.id == bot_id))).scalars().first()
+    if not db_bot:
+        return None, 404
+    return db_bot, 200
+
+async def get_bot_by_name(db: AsyncSession, name: str):
+    db_bot = (await db.execute(select(Bot).where(or_(Bot.name == name, Bot.event_name == name)))).scalars().first()
+    if not db_bot:
+        return None, 404
+    return db_bot, 200
+
+async def get_bot_snapshot(db: AsyncSession, bot_id: UUID):
+    snapshot = get_cached_bot(bot_id)
+    if snapshot is None:
+        db_bot, status = await get_bot(db, bot_id)
+        if status != 200:
+            return None, status
+        snapshot = cache_bot(db_bot)
+    return snapshot, 200
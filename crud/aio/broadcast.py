@@ -0,0 +1,221 @@
+# crud/aio/broadcast.py
+
+from sqlalchemy import select, update, func, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.broadcast import BroadcastJob, BroadcastRecipient, ContactSyncState
+from uuid import UUID
+from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta, timezone
+
+FINAL_STATUSES = ("done", "failed")
+# asyncpg má limit 32767 parametrů na příkaz
+RECIPIENTS_INSERT_CHUNK = 1000
+# okno pro odhad rychlosti odesílání (ETA)
+RATE_WINDOW_SECONDS = 60
+
+async def create_job(db: AsyncSession, job_id: UUID, mode: str, session: str, message: str, lang: str,
+                     file_path: Optional[str] = None, file_name: Optional[str] = None, file_mime: Optional[str] = None,
+                     file_sha256: Optional[str] = None) -> BroadcastJob:
+    db_job = BroadcastJob(
+        id=job_id,
+        mode=mode,
+        status="queued",
+        session=session,
+        message=message,
+        lang=lang,
+        file_path=file_path,
+        file_name=file_name,
+        file_mime=file_mime,
+        file_sha256=file_sha256,
+    )
+    db.add(db_job)
+    await db.commit()
+    return db_job
+
+async def get_job(db: AsyncSession, job_id: UUID):
+    db_job = await db.get(BroadcastJob, job_id)
+    if not db_job:
+        return None, 404
+    return db_job, 200
+
+async def claim_job(db: AsyncSession, lease_seconds: int, exclude: List[UUID] = ()) -> Optional[BroadcastJob]:
+    """Zabere nejstarší job bez platného leasu (nový nebo po pádu workeru)."""
+    now = datetime.now(timezone.utc)
+    claimable = (
+        select(BroadcastJob.id)
+        .where(
+            BroadcastJob.status.in_(("queued", "running")),
+            (BroadcastJob.lease_until == None) | (BroadcastJob.lease_until <= now),
+            BroadcastJob.id.notin_(exclude) if exclude else true(),
+        )
+        .order_by(BroadcastJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    db_job = (await db.execute(
+        update(BroadcastJob)
+        .where(BroadcastJob.id == claimable)
+        .values(
+            attempts=BroadcastJob.attempts + 1,
+            lease_until=now + timedelta(seconds=lease_seconds),
+            started_at=func.coalesce(BroadcastJob.started_at, now),
+        )
+        .returning(BroadcastJob)
+        .execution_options(synchronize_session=False)
+    )).scalars().first()
+
+    if db_job:
+        # u příjemců "sending" nevíme, jestli zpráva odešla – raději neposílat dvakrát
+        await db.execute(
+            update(BroadcastRecipient)
+            .where(BroadcastRecipient.job_id == db_job.id, BroadcastRecipient.status == "sending")
+            .values(status="failed", error="Přerušeno při odesílání", finished_at=now)
+        )
+    await db.commit()
+    return db_job
+
+async def renew_lease(db: AsyncSession, job_id: UUID, lease_seconds: int):
+    await db.execute(
+        update(BroadcastJob)
+        .where(BroadcastJob.id == job_id)
+        .values(lease_until=datetime.now(timezone.utc) + timedelta(seconds=lease_seconds))
+    )
+    await db.commit()
+
+async def release_job(db: AsyncSession, job_id: UUID, retry_at: Optional[datetime] = None, error: Optional[str] = None):
+    await db.execute(
+        update(BroadcastJob)
+        .where(BroadcastJob.id == job_id)
+        .values(lease_until=retry_at or datetime.now(timezone.utc), error=error)
+    )
+    await db.commit()
+
+async def save_recipients(db: AsyncSession, job_id: UUID, users: List[Dict[str, Any]]) -> int:
+    """Uloží příjemce a přepne job do "running" v jedné transakci – seznam se pak už nepřepočítává."""
+    rows = [{**user, "job_id": job_id, "position": index, "status": "pending"} for index, user in enumerate(users)]
+    for start in range(0, len(rows), RECIPIENTS_INSERT_CHUNK):
+        chunk = rows[start:start + RECIPIENTS_INSERT_CHUNK]
+        await db.execute(insert(BroadcastRecipient).values(chunk).on_conflict_do_nothing(index_elements=["job_id", "user_id"]))
+    await db.execute(update(BroadcastJob).where(BroadcastJob.id == job_id).values(status="running", total=len(users)))
+    await db.commit()
+    return len(users)
+
+async def next_recipients(db: AsyncSession, job_id: UUID, limit: int) -> List[BroadcastRecipient]:
+    return (await db.execute(
+        select(BroadcastRecipient)
+        .where(BroadcastRecipient.job_id == job_id, BroadcastRecipient.status == "pending")
+        .order_by(BroadcastRecipient.position)
+        .limit(limit)
+    )).scalars().all()
+
+async def mark_recipient_sending(db: AsyncSession, job_id: UUID, user_id: int) -> bool:
+    """Checkpoint před odesláním; False = příjemce už zpracoval někdo jiný."""
+    result = await db.execute(
+        update(BroadcastRecipient)
+        .where(BroadcastRecipient.job_id == job_id, BroadcastRecipient.user_id == user_id, BroadcastRecipient.status == "pending")
+        .values(status="sending")
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def mark_recipient_pending(db: AsyncSession, job_id: UUID, user_id: int):
+    # vrácení do fronty (FloodWait) – zpráva prokazatelně neodešla
+    await db.execute(
+        update(BroadcastRecipient)
+        .where(BroadcastRecipient.job_id == job_id, BroadcastRecipient.user_id == user_id, BroadcastRecipient.status == "sending")
+        .values(status="pending")
+    )
+    await db.commit()
+
+async def mark_recipient_done(db: AsyncSession, job_id: UUID, user_id: int, error: Optional[str] = None):
+    await db.execute(
+        update(BroadcastRecipient)
+        .where(BroadcastRecipient.job_id == job_id, BroadcastRecipient.user_id == user_id)
+        .values(status="failed" if error else "sent", error=error, finished_at=datetime.now(timezone.utc))
+    )
+    await db.commit()
+
+async def finish_job(db: AsyncSession, job_id: UUID, status: str, error: Optional[str] = None):
+    # session je přístup k účtu, po doběhnutí ji nechceme držet v DB
+    await db.execute(
+        update(BroadcastJob)
+        .where(BroadcastJob.id == job_id)
+        .values(status=status, error=error, session=None, lease_until=None, finished_at=datetime.now(timezone.utc))
+    )
+    await db.commit()
+
+async def get_job_progress(db: AsyncSession, job_id: UUID) -> Optional[Dict[str, Any]]:
+    db_job, status = await get_job(db, job_id)
+    if status != 200:
+        return None
+
+    now = datetime.now(timezone.utc)
+    recent_since = now - timedelta(seconds=RATE_WINDOW_SECONDS)
+    sent, failed, remaining, recent = (await db.execute(
+        select(
+            func.count().filter(BroadcastRecipient.status == "sent"),
+            func.count().filter(BroadcastRecipient.status == "failed"),
+            func.count().filter(BroadcastRecipient.status.in_(("pending", "sending"))),
+            func.count().filter(BroadcastRecipient.finished_at >= recent_since),
+        ).where(BroadcastRecipient.job_id == job_id)
+    )).one()
+
+    # na začátku jobu je okno kratší než RATE_WINDOW_SECONDS
+    window = RATE_WINDOW_SECONDS
+    if db_job.started_at:
+        window = min(window, max((now - db_job.started_at).total_seconds(), 1))
+    rate = recent / window
+    eta = None
+    if db_job.total is not None:
+        eta = 0 if not remaining else (round(remaining / rate) if rate else None)
+    errors = (await db.execute(
+        select(BroadcastRecipient.user_id, BroadcastRecipient.username, BroadcastRecipient.error)
+        .where(BroadcastRecipient.job_id == job_id, BroadcastRecipient.status == "failed")
+        .order_by(BroadcastRecipient.position)
+        .limit(100)
+    )).all()
+
+    return {
+        "job_id": db_job.id,
+        "mode": db_job.mode,
+        "status": db_job.status,
+        "total": db_job.total,
+        "sent": sent,
+        "failed": failed,
+        "remaining": remaining if db_job.total is not None else None,
+        "rate": round(rate, 3),
+        "eta_seconds": eta,
+        "error": db_job.error,
+        "failed_recipients": [{"id": user_id, "username": username, "error": error} for user_id, username, error in errors],
+        "created_at": db_job.created_at,
+        "started_at": db_job.started_at,
+        "finished_at": db_job.finished_at,
+    }
+
+async def get_active_file_paths(db: AsyncSession, paths: List[str]) -> set:
+    rows = await db.execute(
+        select(BroadcastJob.file_path).where(BroadcastJob.file_path.in_(paths), BroadcastJob.status.notin_(FINAL_STATUSES))
+    )
+    return set(rows.scalars().all())
+
+async def get_contact_sync(db: AsyncSession, session_key: str) -> Optional[ContactSyncState]:
+    return await db.get(ContactSyncState, session_key)
+
+async def save_contact_sync(db: AsyncSession, session_key: str, contacts: List[Dict[str, Any]], saved_count: int,
+                            contacts_hash: Optional[int], dialogs_synced_at: Optional[datetime], pending: List[Dict[str, Any]] = ()):
+    values = {
+        "contacts": contacts,
+        "pending": list(pending),
+        "saved_count": saved_count,
+        "contacts_hash": contacts_hash,
+        "dialogs_synced_at": dialogs_synced_at,
+        "synced_at": datetime.now(timezone.utc),
+    }
+    await db.execute(
+        insert(ContactSyncState)
+        .values(session_key=session_key, **values)
+        .on_conflict_do_update(index_elements=["session_key"], set_=values)
+    )
+    await db.commit()
@@ -0,0 +1,63 @@
+# crud/aio/links.py
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from crud.links import LINKS_LOCK_NAMESPACE, LOCK_BOT_LINKS
+from utils.link_weights import LINK_SHARE_SCALE
+from crud.aio.user import update_users_academy_link
+from typing import Optional
+from uuid import UUID
+
+# Smooth weighted round-robin (jako nginx) v jednom příkazu: všem odkazům se přičte share,
+# vybere se ten s nejvyšší current_weight a odečte se mu součet podílů. Za cyklus o délce
+# součtu podílů dostane každý odkaz přesně svůj share, rozprostřený rovnoměrně.
+# Váhy jsou celá čísla (share * LINK_SHARE_SCALE), takže přičítání a odečítání je přesné a poměry
+# se neposouvají; utils.link_weights.pick_link dělá totéž v Pythonu.
+# currently_assigned se dál počítá po cyklech kvůli adminu (nulování na začátku dalšího cyklu).
+# Podíly se čtou přímo z list pod zámkem bota: cache vah by mezi procesy mohla být zastaralá
+# a round-robin by pak v každém procesu počítal s jiným součtem podílů.
+ALLOCATE_LINK = text("""
+WITH scaled AS (
+    SELECT id, current_weight, currently_assigned, share, round(share::numeric * :scale)::bigint AS weight
+    FROM list
+    WHERE bot_id = :bot_id
+),
+weights AS (
+    SELECT id, current_weight + weight AS bumped,
+           sum(weight) OVER () AS total,
+           sum(share) OVER () AS cycle,
+           sum(COALESCE(currently_assigned, 0)) OVER () AS assigned
+    FROM scaled
+    WHERE weight > 0
+),
+picked AS (
+    SELECT id FROM weights ORDER BY bumped DESC, id LIMIT 1
+)
+UPDATE list SET
+    current_weight = weights.bumped - CASE WHEN list.id = picked.id THEN weights.total ELSE 0 END,
+    currently_assigned = CASE WHEN weights.assigned >= weights.cycle THEN 0 ELSE COALESCE(list.currently_assigned, 0) END
+        + CASE WHEN list.id = picked.id THEN 1 ELSE 0 END
+FROM weights CROSS JOIN picked
+WHERE list.id = weights.id
+RETURNING list.id = picked.id AS is_picked, list.child
+""")
+
+async def allocate_link(db: AsyncSession, bot_id: UUID) -> Optional[str]:
+    """Vybere další odkaz bota; necommituje, zámek drží až do konce transakce."""
+    # stav round-robinu se čte i zapisuje v jednom UPDATE, zámek jen serializuje souběžné /start téhož bota
+    await db.execute(LOCK_BOT_LINKS, {"namespace": LINKS_LOCK_NAMESPACE, "bot_id": str(bot_id)})
+    rows = await db.execute(ALLOCATE_LINK, {"bot_id": bot_id, "scale": LINK_SHARE_SCALE})
+    return next((child for is_picked, child in rows if is_picked), None)
+
+async def assign_academy_link(db: AsyncSession, bot_id: UUID, user_id: UUID) -> Optional[str]:
+    child = await allocate_link(db, bot_id)
+    if child is None:
+        # uvolní případný zámek; commit (na rozdíl od rollbacku) nevyexpiruje načtené objekty
+        await db.commit()
+        return None
+
+    # přidělení odkazu i zápis k uživateli v jedné transakci
+    if await update_users_academy_link(db, user_id, child) is None:
+        await db.rollback()
+        return None
+    return child
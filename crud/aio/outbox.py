@@ -0,0 +1,23 @@
+# crud/aio/outbox.py
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.outbox import Outbox
+from uuid import UUID
+from typing import List, Optional
+from datetime import datetime
+from crud.outbox import claim_outbox_statement, mark_sent_statement, mark_failed_statement
+
+async def claim_outbox_batch(db: AsyncSession, batch_size: int, lease_seconds: int) -> List[Outbox]:
+    claimed = (await db.execute(claim_outbox_statement(batch_size, lease_seconds))).scalars().all()
+    await db.commit()
+    return claimed
+
+async def mark_outbox_sent(db: AsyncSession, message_ids: List[UUID]):
+    if not message_ids:
+        return
+    await db.execute(mark_sent_statement(message_ids))
+    await db.commit()
+
+async def mark_outbox_failed(db: AsyncSession, message_id: UUID, error: str, retry_at: Optional[datetime] = None):
+    await db.execute(mark_failed_statement(message_id, error, retry_at))
+    await db.commit()
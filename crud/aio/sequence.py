@@ -0,0 +1,25 @@
+# crud/aio/sequence.py
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.bot import Sequence
+from datetime import datetime, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def get_sequences(db: AsyncSession):
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+
+    db_sequences = (await db.execute(
+        select(Sequence).where(
+            Sequence.is_active == True,
+            Sequence.send_at <= now,
+        )
+    )).scalars().all()
+
+    if not db_sequences:
+        logger.info("No sequences ready to be processed.")
+        return [], 404
+
+    return db_sequences, 200
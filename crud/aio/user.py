@@ -0,0 +1,101 @@
+# crud/aio/user.py
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.user import User
+from schemas.user import UserCreate, UsersReference
+from uuid import UUID
+from typing import Optional
+from datetime import datetime, timezone
+from crud.aio.bot import get_bot_snapshot
+from crud.user import new_user, apply_users_position, prepare_trace_message
+from crud.outbox import enqueue_statement
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def get_user(db: AsyncSession, user_id: UUID):
+    return await db.get(User, user_id)
+
+async def get_current_user(db: AsyncSession, chat_id: int, bot_id: UUID):
+    return (await db.execute(select(User).where(User.chat_id == chat_id, User.bot_id == bot_id))).scalars().first()
+
+async def create_user(db: AsyncSession, user: UserCreate):
+    db_user = new_user(user)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def update_users_academy_link(db: AsyncSession, user_id: UUID, academy_link: str):
+    db_user = await get_user(db, user_id)
+    if db_user:
+        db_user.academy_link = academy_link
+        await db.commit()
+    return db_user
+
+async def update_users_position(db: AsyncSession, user_id: UUID, next_message_id: int, next_message_send_after: Optional[int] = None):
+    db_user = await get_user(db, user_id)
+    if db_user:
+        apply_users_position(db_user, next_message_id, next_message_send_after, datetime.now(timezone.utc))
+        await db.commit()
+    return db_user
+
+async def update_users_level(db: AsyncSession, user_id: UUID):
+    db_user = await get_user(db, user_id)
+    if not db_user or db_user.client_level == 2:
+        return
+
+    db_user.client_level = db_user.client_level + 1
+    db_user.next_message_id = 0
+    # bez refresh po commitu, proto rovnou aware čas (stejně jako ho vrací DB)
+    db_user.send_message_at = datetime.now(timezone.utc)
+    await db.commit()
+
+    await send_message_to_user(db, db_user)
+    return db_user
+
+async def update_rating(db: AsyncSession, user_id: UUID, rating: int):
+    db_user = await get_user(db, user_id)
+    if db_user:
+        db_user.rating = rating
+        await db.commit()
+    return db_user
+
+async def update_reference(db: AsyncSession, user_id: UUID, reference: str):
+    db_user = await get_user(db, user_id)
+    if db_user:
+        db_user.reference = reference
+        await db.commit()
+    return db_user
+
+async def get_references(db: AsyncSession, all_references: bool = False):
+    query = select(User).where(User.rating > 4).order_by(User.rating.desc())
+
+    if not all_references:
+        query = query.limit(10)
+
+    users = (await db.execute(query)).scalars().all()
+    return [UsersReference(
+        name=user.name,
+        content=user.reference,
+        created_at=user.created_at,
+        rating=user.rating,
+    ) for user in users if user.reference]
+
+async def send_message_to_user(db: AsyncSession, user: User):
+    bot, status = await get_bot_snapshot(db, user.bot_id)
+    if status != 200:
+        logger.error(f"Failed to get bot data, status: {status}")
+        return
+
+    message, outbox_row = prepare_trace_message(bot, user)
+    if message is None:
+        return
+
+    if outbox_row:
+        await db.execute(enqueue_statement([outbox_row]))
+        logger.info(f"Message queued for {user.chat_id}")
+
+    # zařazení do outboxu a posun pozice se commitují spolu
+    await update_users_position(db, user.id, message["next_message_id"], message.get("next_message_send_after"))
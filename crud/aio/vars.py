@@ -0,0 +1,20 @@
+# crud/aio/vars.py
+
+import logging
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import UUID
+from crud.aio.bot import get_bot_snapshot
+from crud.vars import render_message
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+async def replace_variables(db: AsyncSession, bot_id: UUID, chat_id: int, message: str):
+    bot, status = await get_bot_snapshot(db, bot_id)
+    user = (await db.execute(select(User).where(User.chat_id == chat_id, User.bot_id == bot_id))).scalars().first()
+
+    if not user:
+        logger.warning(f"⚠️ Uživatel nenalezen pro chat_id {chat_id}, bot_id {bot_id}")
+
+    return render_message(bot, user, message)
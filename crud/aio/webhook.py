@@ -0,0 +1,12 @@
+# crud/aio/webhook.py
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import UUID
+from crud.webhook import claim_update_statement
+
+async def claim_update(db: AsyncSession, bot_id: UUID, update_id: int) -> bool:
+    """Zapíše update jako zpracovávaný. Necommituje – záznam se potvrdí spolu se zpracováním.
+
+    Souběžný pokus se stejným update_id počká na commit první transakce a vrátí False.
+    """
+    return (await db.execute(claim_update_statement(bot_id, update_id))).first() is not None
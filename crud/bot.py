@@ -7,14 +7,16 @@ from security import get_password_hash, verify_password
 from base64 import b64decode, b64encode
 import uuid
 from uuid import UUID
-import requests
+from utils import telegram_api
 from sqlalchemy import or_
 from datetime import datetime, timedelta
 from typing import Optional, Tuple, List
 from fastapi import Request
+from utils.bot_cache import get_cached_bot, cache_bot, invalidate_bot
+from crud.rollup import count_visits, count_users_by_level
 
 def verify_token(db: Session, bot_id: UUID, token: str) -> bool:
-    bot, status = get_bot(db, bot_id)
+    bot, status = get_bot_snapshot(db, bot_id)
     if bot and bot.token == token:
         return True
     return False
@@ -43,6 +45,16 @@ def get_bot(db: Session, bot_id: UUID):
         return None, 404
     return db_bot, 200
 
+# neměnný snímek bota z cache, do DB jen po vypršení TTL nebo invalidaci
+def get_bot_snapshot(db: Session, bot_id: UUID):
+    snapshot = get_cached_bot(bot_id)
+    if snapshot is None:
+        db_bot, status = get_bot(db, bot_id)
+        if status != 200:
+            return None, status
+        snapshot = cache_bot(db_bot)
+    return snapshot, 200
+
 def get_public_bot(db: Session, name: str):
     db_bot = db.query(Bot).filter(
         or_(
@@ -71,24 +83,20 @@ def get_public_bot(db: Session, name: str):
 
 
 
-def sign_up(db: Session, bot: SignUp):
+async def get_bot_url(token: str) -> Optional[str]:
+    try:
+        me = await telegram_api.get_me(token)
+    except telegram_api.TelegramAPIError:
+        return None
+    username = me.get("username")
+    return f"https://t.me/{username}" if username else None
+
+def sign_up(db: Session, bot: SignUp, bot_url: Optional[str] = None):
     decoded_password = _decode_base64_with_padding(bot.password)
     hashed_password = get_password_hash(decoded_password)
 
     bot_id = uuid.uuid4()
 
-    telegram_api_url = f"https://api.telegram.org/bot{bot.token}/getMe"
-    response = requests.get(telegram_api_url)
-
-    bot_url = None
-    if response.status_code == 200:
-        data = response.json()
-        if data.get("ok"):
-            username = data["result"].get("username")
-            if username:
-                bot_url = f"https://t.me/{username}"
-
-
     db_bot = Bot(
         id=bot_id,
         name=bot.name,
@@ -102,6 +110,7 @@ def sign_up(db: Session, bot: SignUp):
     db.add(db_bot)
     db.commit()
     db.refresh(db_bot)
+    invalidate_bot(db, bot_id)
 
     return bot_id, 200
 
@@ -138,6 +147,7 @@ def update_bot(db: Session, bot_id: UUID, bot: UpdateBot):
         setattr(db_bot, key, value)
     db.commit()
     db.refresh(db_bot)
+    invalidate_bot(db, bot_id)
     return db_bot, 200
 
 def increase_analytic_data(db: Session, bot_name: UUID):
@@ -188,35 +198,18 @@ def get_statistics(
     start, end = get_range(interval, custom_range)
     prev_start, prev_end = get_previous_range(start, end) if start and end else (None, None)
 
-    def get_analytics_count(s: Optional[datetime], e: Optional[datetime]) -> int:
-        query = db.query(AnalyticData).filter(AnalyticData.bot_id == bot_id)
-        if s: query = query.filter(AnalyticData.created_at >= s)
-        if e: query = query.filter(AnalyticData.created_at <= e)
-        return query.count()
-
-    def get_users(s: Optional[datetime], e: Optional[datetime]) -> List[User]:
-        query = db.query(User).filter(User.bot_id == bot_id)
-        if s: query = query.filter(User.created_at >= s)
-        if e: query = query.filter(User.created_at <= e)
-        return query.all()
-
-    analytics_now = get_analytics_count(start, end)
-    analytics_prev = get_analytics_count(prev_start, prev_end)
-
-    users_now = get_users(start, end)
-    users_prev = get_users(prev_start, prev_end)
-
-    level_counts_now = {0: 0, 1: 0, 2: 0}
-    level_counts_prev = {0: 0, 1: 0, 2: 0}
-    for u in users_now:
-        if u.client_level in level_counts_now:
-            level_counts_now[u.client_level] += 1
-    for u in users_prev:
-        if u.client_level in level_counts_prev:
-            level_counts_prev[u.client_level] += 1
-
-    total_now = len(users_now)
-    total_prev = len(users_prev)
+    # hodinové rollupy + syrová data jen pro okrajové hodiny, viz crud.rollup
+    analytics_now = count_visits(db, bot_id, start, end)
+    analytics_prev = count_visits(db, bot_id, prev_start, prev_end)
+
+    users_now = count_users_by_level(db, bot_id, start, end)
+    users_prev = count_users_by_level(db, bot_id, prev_start, prev_end)
+
+    level_counts_now = {level: users_now.get(level, 0) for level in (0, 1, 2)}
+    level_counts_prev = {level: users_prev.get(level, 0) for level in (0, 1, 2)}
+
+    total_now = sum(users_now.values())
+    total_prev = sum(users_prev.values())
 
     staked_now = level_counts_now[1]
     staked_prev = level_counts_prev[1]
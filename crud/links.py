@@ -1,9 +1,14 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import text
 from models.bot import BotList
 from schemas.links import CreateLink, ReadLink, UpdateLink
 import uuid
 from uuid import UUID
 
+# jmenný prostor pro pg_advisory_xact_lock(int, int), druhý klíč je hash bot_id
+LINKS_LOCK_NAMESPACE = 724_118_002
+LOCK_BOT_LINKS = text("SELECT pg_advisory_xact_lock(:namespace, hashtext(:bot_id))")
+
 def get_link(db: Session, link_id: UUID):
     db_link = db.query(BotList).filter(BotList.id == link_id).first()
     if not db_link:
@@ -55,13 +60,21 @@ def update_link(db: Session, link_id: UUID, link: UpdateLink):
     if not db_link:
         return 404, None
 
-    for key, value in link.dict(exclude_unset=True).items():
+    updates = link.dict(exclude_unset=True)
+    for key, value in updates.items():
         setattr(db_link, key, value)
 
+    if "share" in updates:
+        reset_link_weights(db, db_link.bot_id)
     db.commit()
     db.refresh(db_link)
     return db_link, 200
 
+def reset_link_weights(db: Session, bot_id: UUID):
+    # nové podíly (nebo smazaný odkaz) = nový cyklus od nuly, ať se nedoplácí dluh ze starých podílů
+    db.execute(LOCK_BOT_LINKS, {"namespace": LINKS_LOCK_NAMESPACE, "bot_id": str(bot_id)})
+    db.query(BotList).filter(BotList.bot_id == bot_id).update({BotList.current_weight: 0}, synchronize_session=False)
+
 def create_link(db: Session, bot_id: UUID):
     db_links, status = get_all_links(db, bot_id)
 
@@ -84,7 +97,9 @@ def create_link(db: Session, bot_id: UUID):
 def delete_link(db: Session, link_id: UUID):
     db_link, status = get_base_link(db, link_id)
     if db_link:
+        bot_id = db_link.bot_id
         db.delete(db_link)
+        reset_link_weights(db, bot_id)
         db.commit()
         return 200, True
     return 404, False
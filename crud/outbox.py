@@ -0,0 +1,158 @@
+# crud/outbox.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy import update, select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from models.outbox import Outbox
+from uuid import UUID, uuid4
+from typing import List, Optional, Dict, Any
+from datetime import datetime, timedelta, timezone
+
+def _outbox_row(bot_id: UUID, chat_id: int, text: str, reply_markup: Optional[Dict[str, Any]] = None, dedup_key: Optional[str] = None):
+    return {
+        "id": uuid4(),
+        "bot_id": bot_id,
+        "chat_id": chat_id,
+        "text": text,
+        "reply_markup": reply_markup,
+        "parse_mode": "html",
+        "dedup_key": dedup_key,
+        "state": "pending",
+        "attempts": 0,
+    }
+
+def enqueue_message(
+    db: Session,
+    bot_id: UUID,
+    chat_id: int,
+    text: str,
+    reply_markup: Optional[Dict[str, Any]] = None,
+    dedup_key: Optional[str] = None,
+) -> bool:
+    """Zařadí zprávu do outboxu. Necommituje – zápis patří do transakce volajícího."""
+    result = db.execute(enqueue_statement([{
+        "bot_id": bot_id, "chat_id": chat_id, "text": text, "reply_markup": reply_markup, "dedup_key": dedup_key,
+    }]))
+    return result.rowcount == 1
+
+def enqueue_messages(db: Session, rows: List[Dict[str, Any]]) -> int:
+    if not rows:
+        return 0
+    return db.execute(enqueue_statement(rows)).rowcount
+
+def enqueue_statement(rows: List[Dict[str, Any]]):
+    return (
+        insert(Outbox)
+        .values([_outbox_row(**row) for row in rows])
+        .on_conflict_do_nothing(index_elements=["dedup_key"])
+    )
+
+def claim_outbox_statement(batch_size: int, lease_seconds: int):
+    # zprávy ve stavu "sending" s prošlým leasem patří workeru, který spadl uprostřed odesílání
+    now = datetime.now(timezone.utc)
+    claimable = (
+        select(Outbox.id)
+        .where(Outbox.state.in_(("pending", "sending")), Outbox.next_attempt_at <= now)
+        .order_by(Outbox.next_attempt_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return (
+        update(Outbox)
+        .where(Outbox.id.in_(claimable))
+        .values(
+            state="sending",
+            attempts=Outbox.attempts + 1,
+            next_attempt_at=now + timedelta(seconds=lease_seconds),
+        )
+        .returning(Outbox)
+        .execution_options(synchronize_session=False)
+    )
+
+def mark_sent_statement(message_ids: List[UUID]):
+    return (
+        update(Outbox)
+        .where(Outbox.id.in_(message_ids))
+        .values(state="sent", sent_at=datetime.now(timezone.utc), last_error=None)
+        .execution_options(synchronize_session=False)
+    )
+
+def mark_failed_statement(message_id: UUID, error: str, retry_at: Optional[datetime] = None):
+    return (
+        update(Outbox)
+        .where(Outbox.id == message_id)
+        .values(
+            state="pending" if retry_at else "failed",
+            next_attempt_at=retry_at or datetime.now(timezone.utc),
+            last_error=error,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+def claim_outbox_batch(db: Session, batch_size: int, lease_seconds: int) -> List[Outbox]:
+    claimed = db.execute(claim_outbox_statement(batch_size, lease_seconds)).scalars().all()
+    # odpojené objekty si nechají načtená data, commit by je jinak expiroval
+    for message in claimed:
+        db.expunge(message)
+    db.commit()
+    return claimed
+
+def mark_outbox_sent(db: Session, message_ids: List[UUID]):
+    if not message_ids:
+        return
+    db.execute(mark_sent_statement(message_ids))
+    db.commit()
+
+def mark_outbox_failed(db: Session, message_id: UUID, error: str, retry_at: Optional[datetime] = None):
+    db.execute(mark_failed_statement(message_id, error, retry_at))
+    db.commit()
+
+def get_outbox_depth(db: Session) -> Dict[str, int]:
+    rows = db.query(Outbox.state, func.count()).filter(Outbox.state.in_(("pending", "sending"))).group_by(Outbox.state).all()
+    return {state: count for state, count in rows}
+
+def get_delivery_stats(db: Session, dedup_prefix: str) -> Dict[str, Any]:
+    """Doručenost zpráv jednoho běhu (např. sekvence) podle prefixu dedup_key.
+
+    Propustnost je počet odeslaných za dobu od prvního zařazení do posledního odeslání.
+    """
+    rows = (
+        db.query(Outbox.state, func.count(), func.min(Outbox.created_at), func.max(Outbox.sent_at))
+        .filter(Outbox.dedup_key.like(f"{dedup_prefix}%"))
+        .group_by(Outbox.state)
+        .all()
+    )
+    counts = {state: count for state, count, _, _ in rows}
+    first_queued = min((queued for _, _, queued, _ in rows if queued), default=None)
+    last_sent = max((sent for _, _, _, sent in rows if sent), default=None)
+
+    sent = counts.get("sent", 0)
+    duration = (last_sent - first_queued).total_seconds() if first_queued and last_sent else 0.0
+    return {
+        "sent": sent,
+        "failed": counts.get("failed", 0),
+        "pending": counts.get("pending", 0) + counts.get("sending", 0),
+        "delivery_duration": round(duration, 2),
+        "throughput": round(sent / duration, 2) if duration > 0 else 0.0,
+    }
+
+def purge_outbox(db: Session, state: str, older_than: datetime, batch_size: int) -> int:
+    """Smaže dokončené zprávy (sent/failed) starší než older_than, po dávkách kvůli krátkým zámkům.
+
+    Filtruje se přes next_attempt_at (index ix_outbox_state_next_attempt_at): u "sent" je to konec
+    leasu při odeslání, u "failed" čas posledního pokusu.
+    """
+    deleted = 0
+    while True:
+        batch = (
+            select(Outbox.id)
+            .where(Outbox.state == state, Outbox.next_attempt_at < older_than)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        count = db.execute(delete(Outbox).where(Outbox.id.in_(batch)).execution_options(synchronize_session=False)).rowcount
+        db.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
@@ -0,0 +1,183 @@
+# crud/rollup.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func, text, union_all, literal, and_, or_, true
+from models.bot import AnalyticData
+from models.user import User
+from models.rollup import AnalyticHourly, UserCohortHourly, UserLevelChange, RollupState
+from uuid import UUID
+from typing import Optional, Dict, Tuple
+from datetime import datetime, timedelta, timezone
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", "50000"))
+# návštěvy se do rollupu přelévají podle času zápisu (inserted_at) s rezervou na pozdě commitnuté řádky
+ROLLUP_GRACE_SECONDS = int(os.getenv("ROLLUP_GRACE_SECONDS", "300"))
+
+VISITS_WATERMARK = "analytic_hourly"
+
+FOLD_LEVEL_CHANGES = text("""
+WITH moved AS (
+    DELETE FROM user_level_changes
+    WHERE id IN (SELECT id FROM user_level_changes ORDER BY id LIMIT :batch_size FOR UPDATE SKIP LOCKED)
+    RETURNING *
+),
+deltas AS (
+    SELECT bot_id, created_bucket, to_level AS client_level, 1 AS delta FROM moved WHERE op <> 'delete'
+    UNION ALL
+    SELECT bot_id, created_bucket, from_level, -1 FROM moved WHERE op <> 'insert'
+),
+cohorts AS (
+    INSERT INTO user_cohort_hourly (bot_id, bucket, client_level, users)
+    SELECT bot_id, created_bucket, client_level, sum(delta) FROM deltas GROUP BY 1, 2, 3
+    ON CONFLICT (bot_id, bucket, client_level) DO UPDATE SET users = user_cohort_hourly.users + EXCLUDED.users
+),
+transitions AS (
+    INSERT INTO level_transition_hourly (bot_id, bucket, from_level, to_level, transitions)
+    SELECT bot_id, date_trunc('hour', changed_at, 'UTC'), from_level, to_level, count(*)
+    FROM moved WHERE op = 'update' GROUP BY 1, 2, 3, 4
+    ON CONFLICT (bot_id, bucket, from_level, to_level) DO UPDATE SET transitions = level_transition_hourly.transitions + EXCLUDED.transitions
+)
+SELECT count(*) FROM moved
+""")
+
+# watermark je čas zápisu, bucket čas návštěvy: opožděný flush se přičte i do už přelitých hodin
+# NULL inserted_at mají řádky z doby před migrací 0010, ty přelil běh podle created_at
+FOLD_VISITS = text("""
+INSERT INTO analytic_hourly (bot_id, bucket, visits)
+SELECT bot_id, date_trunc('hour', created_at, 'UTC'), count(*)
+FROM analytic_data
+WHERE (inserted_at < :until OR inserted_at IS NULL AND CAST(:since AS TIMESTAMPTZ) IS NULL)
+  AND (CAST(:since AS TIMESTAMPTZ) IS NULL OR inserted_at >= :since)
+GROUP BY 1, 2
+ON CONFLICT (bot_id, bucket) DO UPDATE SET visits = analytic_hourly.visits + EXCLUDED.visits
+""")
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # naivní časy v aplikaci jsou UTC (datetime.utcnow)
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def _ceil_hour(value: datetime) -> datetime:
+    floored = _floor_hour(value)
+    return floored if floored == value else floored + timedelta(hours=1)
+
+def _full_hours(start: Optional[datetime], end: Optional[datetime]) -> Tuple[Optional[datetime], Optional[datetime], bool]:
+    """Celé hodiny uvnitř [start, end]; třetí hodnota říká, jestli nějaké jsou."""
+    full_start = _ceil_hour(start) if start else None
+    full_end = _floor_hour(end) if end else None
+    has_full = not (full_start and full_end and full_start >= full_end)
+    return full_start, full_end, has_full
+
+def _raw_window(column, start, end, full_start, full_end, has_full):
+    # syrové řádky jen pro neúplné okrajové hodiny
+    in_range = and_(true(), *([column >= start] if start else []), *([column <= end] if end else []))
+    if not has_full:
+        return in_range
+    edges = []
+    if start:
+        edges.append(and_(column >= start, column < full_start))
+    if full_end:
+        edges.append(and_(column >= full_end, *([column <= end] if end else [])))
+    return or_(*edges) if edges else None
+
+def _bucket_window(column, full_start, full_end):
+    return and_(true(), *([column >= full_start] if full_start else []), *([column < full_end] if full_end else []))
+
+def get_visits_watermark(db: Session) -> Optional[datetime]:
+    return db.query(RollupState.watermark).filter(RollupState.name == VISITS_WATERMARK).scalar()
+
+def count_visits(db: Session, bot_id: UUID, start: Optional[datetime], end: Optional[datetime]) -> int:
+    start, end = _utc(start), _utc(end)
+    full_start, full_end, has_full = _full_hours(start, end)
+
+    # v rollupu jsou jen hodiny před watermarkem, zbytek se dopočítá ze syrových dat
+    watermark = get_visits_watermark(db)
+    if watermark is None:
+        has_full = False
+    elif full_end is None or full_end > watermark:
+        full_end = watermark
+    if has_full and full_start and full_start >= full_end:
+        has_full = False
+
+    parts = []
+    if has_full:
+        parts.append(
+            select(func.coalesce(func.sum(AnalyticHourly.visits), 0).label("visits"))
+            .where(AnalyticHourly.bot_id == bot_id, _bucket_window(AnalyticHourly.bucket, full_start, full_end))
+        )
+        # návštěvy z těchto hodin zapsané až po watermarku (zpožděný flush) v rollupu ještě nejsou
+        parts.append(
+            select(func.count().label("visits"))
+            .where(AnalyticData.bot_id == bot_id, AnalyticData.inserted_at >= watermark,
+                   _bucket_window(AnalyticData.created_at, full_start, full_end))
+        )
+    raw_window = _raw_window(AnalyticData.created_at, start, end, full_start, full_end, has_full)
+    if raw_window is not None:
+        parts.append(select(func.count().label("visits")).where(AnalyticData.bot_id == bot_id, raw_window))
+
+    parts = union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+    return int(db.execute(select(func.sum(parts.c.visits))).scalar() or 0)
+
+def count_users_by_level(db: Session, bot_id: UUID, start: Optional[datetime], end: Optional[datetime]) -> Dict[int, int]:
+    """Uživatelé registrovaní v [start, end] podle aktuálního levelu (NULL level = -1)."""
+    start, end = _utc(start), _utc(end)
+    full_start, full_end, has_full = _full_hours(start, end)
+
+    parts = []
+    if has_full:
+        # rollup + změny z logu, které úloha ještě nepřelila
+        parts.append(
+            select(UserCohortHourly.client_level.label("level"), UserCohortHourly.users.label("users"))
+            .where(UserCohortHourly.bot_id == bot_id, _bucket_window(UserCohortHourly.bucket, full_start, full_end))
+        )
+        pending = and_(UserLevelChange.bot_id == bot_id, _bucket_window(UserLevelChange.created_bucket, full_start, full_end))
+        parts.append(
+            select(UserLevelChange.to_level.label("level"), literal(1).label("users"))
+            .where(pending, UserLevelChange.op != "delete")
+        )
+        parts.append(
+            select(UserLevelChange.from_level.label("level"), literal(-1).label("users"))
+            .where(pending, UserLevelChange.op != "insert")
+        )
+    raw_window = _raw_window(User.created_at, start, end, full_start, full_end, has_full)
+    if raw_window is not None:
+        level = func.coalesce(User.client_level, -1)
+        parts.append(
+            select(level.label("level"), func.count().label("users"))
+            .where(User.bot_id == bot_id, raw_window)
+            .group_by(level)
+        )
+
+    counts = union_all(*parts).subquery()
+    rows = db.execute(select(counts.c.level, func.sum(counts.c.users)).group_by(counts.c.level)).all()
+    return {level: int(users) for level, users in rows if users}
+
+def refresh_rollups(db: Session) -> Dict[str, object]:
+    """Inkrementálně doplní hodinové rollupy; bezpečné pustit souběžně i opakovaně."""
+    folded = 0
+    while True:
+        moved = db.execute(FOLD_LEVEL_CHANGES, {"batch_size": ROLLUP_BATCH_SIZE}).scalar()
+        db.commit()
+        folded += moved
+        if moved < ROLLUP_BATCH_SIZE:
+            break
+
+    until = _floor_hour(datetime.now(timezone.utc) - timedelta(seconds=ROLLUP_GRACE_SECONDS))
+    # řádek watermarku zakládá migrace; zámek serializuje souběžné běhy úlohy
+    state = db.query(RollupState).filter(RollupState.name == VISITS_WATERMARK).with_for_update().one()
+    if state.watermark is None or state.watermark < until:
+        db.execute(FOLD_VISITS, {"since": state.watermark, "until": until})
+        state.watermark = until
+    db.commit()
+
+    return {"level_changes": folded, "visits_watermark": until.isoformat()}
@@ -1,18 +1,18 @@
 # crud/user.py
 
 from sqlalchemy.orm import Session
-from sqlalchemy import asc, desc
+from sqlalchemy import asc, desc, or_, select, update, tuple_
 from models.user import User, Target
 from schemas.user import UserCreate, UserBase, UsersReference, PublicUser, TargetCreate, TargetUpdate
 from uuid import UUID, uuid4
 from typing import List, Optional, Literal, Tuple, Dict, Any
 from datetime import datetime, timedelta, timezone
-from crud.bot import get_bot
+from crud.bot import get_bot, get_bot_snapshot
 from base64 import b64decode
-from utils.messages import get_messages
-from crud.vars import replace_variables
-import requests
+from utils.messages import get_trace_message
+from crud.vars import render_message
 import logging
+from crud.outbox import enqueue_message
 from math import ceil
 
 logger = logging.getLogger(__name__)
@@ -43,8 +43,8 @@ def get_next_friday_or_monday_at(hour: int):
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def create_user(db: Session, user: UserCreate):
-    db_user = User(
+def new_user(user: UserCreate) -> User:
+    return User(
         id=uuid4(), 
         from_id=user.from_id, 
         chat_id=user.chat_id,
@@ -56,6 +56,9 @@ def create_user(db: Session, user: UserCreate):
         name=user.name[0].upper() + user.name[1:] if user.name else None,
         username=user.username,
     )
+
+def create_user(db: Session, user: UserCreate):
+    db_user = new_user(user)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
@@ -135,6 +138,19 @@ def get_all_public_users(
 def get_audience(db: Session, bot_id: UUID, audience: List[int]):
     return db.query(User).filter(User.bot_id == bot_id, User.client_level.in_(audience)).all()
 
+def iter_audience(db: Session, bot_id: UUID, audience: List[int], chunk_size: int = 500):
+    # keyset stránkování podle id, publikum se nikdy nenačítá celé najednou
+    last_id = None
+    while True:
+        query = db.query(User).filter(User.bot_id == bot_id, User.client_level.in_(audience))
+        if last_id is not None:
+            query = query.filter(User.id > last_id)
+        users = query.order_by(User.id).limit(chunk_size).all()
+        if not users:
+            return
+        yield users
+        last_id = users[-1].id
+
 def get_current_user(db: Session, chat_id: int, bot_id: UUID):
     return db.query(User).filter(User.chat_id == chat_id, User.bot_id == bot_id).first()
     
@@ -147,13 +163,62 @@ def delete_users(db: Session, user_ids: List[UUID]) -> int:
     return deleted_count
 
 def get_users_in_queue(db: Session):
-    try:
-        now = datetime.utcnow()
-        users = db.query(User).filter(User.send_message_at <= now).limit(100).all()
-        
-        return users
-    finally:
-        db.close()
+    now = datetime.utcnow()
+    return db.query(User).filter(User.send_message_at <= now).order_by(User.send_message_at).limit(100).all()
+
+def claim_users_in_queue(db: Session, batch_size: int = 100, lease_seconds: int = 300, after: Optional[Tuple[datetime, UUID]] = None):
+    # SKIP LOCKED + lease: souběžné workery si nikdy nevezmou stejného uživatele
+    now = datetime.now(timezone.utc)
+    claimable = (
+        select(User.id)
+        .where(
+            User.send_message_at <= now,
+            or_(User.queue_lease_until.is_(None), User.queue_lease_until < now),
+            # průchod pokračuje za posledním zabraným, neposunutí uživatelé (bez zprávy, chyba) se v něm znovu neberou
+            *([tuple_(User.send_message_at, User.id) > tuple_(*after)] if after else []),
+        )
+        .order_by(User.send_message_at, User.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    users = db.execute(
+        update(User)
+        .where(User.id.in_(claimable))
+        .values(queue_lease_until=now + timedelta(seconds=lease_seconds))
+        .returning(User)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    for user in users:
+        db.expunge(user)
+    db.commit()
+    return sorted(users, key=lambda user: (user.send_message_at, user.id))
+
+def release_users_lease(db: Session, users: List[User]):
+    """Uvolní lease celé zabrané dávky bez ohledu na výsledek (bez zprávy, chybějící bot, chyba)."""
+    if not users:
+        return
+    # claim dává celé dávce stejný lease; jen ten vlastní, po vypršení mohl uživatele zabrat jiný worker
+    db.execute(
+        update(User)
+        .where(User.id.in_([user.id for user in users]), User.queue_lease_until == users[0].queue_lease_until)
+        .values(queue_lease_until=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+def apply_users_position(db_user: User, next_message_id: int, next_message_send_after: Optional[int], now: datetime):
+    db_user.next_message_id = next_message_id
+    db_user.queue_lease_until = None
+    if next_message_id == 1 and db_user.client_level == 0:
+        return
+
+    if next_message_send_after:
+        logger.info("next_message_send_after exists")
+        db_user.send_message_at = now + timedelta(minutes=next_message_send_after)
+    else:
+        logger.info("next_message_send_after ain't exists")
+        db_user.send_message_at = None
 
 def update_users_position(db: Session, user_id: UUID, next_message_id: str, next_message_send_after: Optional[int] = None):
     now = datetime.now()
@@ -161,18 +226,7 @@ def update_users_position(db: Session, user_id: UUID, next_message_id: str, next
     db_user = db.query(User).filter(User.id == user_id).first()
 
     if db_user:
-        db_user.next_message_id = next_message_id
-        if next_message_id == 1 and db_user.client_level == 0:
-            db.commit()
-            db.refresh(db_user)
-            return db_user
-
-        if next_message_send_after:
-            logger.info("next_message_send_after exists")
-            db_user.send_message_at = now + timedelta(minutes=next_message_send_after)
-        else:
-            logger.info("next_message_send_after ain't exists")
-            db_user.send_message_at = None
+        apply_users_position(db_user, next_message_id, next_message_send_after, now)
         db.commit()
         db.refresh(db_user)
     return db_user
@@ -213,17 +267,6 @@ def save_users_level(db: Session, user_id: UUID):
     send_message_to_user(db, db_user)
     return db_user
 
-def update_rating(db: Session, user_id: UUID, value: int):
-    db_user = db.query(User).filter(User.id == user_id).first()
-    if db_user:
-        db_user.rating = value
-        
-        db.commit()
-        db.refresh(db_user)
-
-    send_message_to_user(db, db_user)
-    return db_user
-
 def update_rating(db: Session, user_id: UUID, rating: int):
     db_user = db.query(User).filter(User.id == user_id).first()
     if db_user:
@@ -259,23 +302,33 @@ def get_references(db: Session, all_references: bool = False):
     return references
 
 
-def send_message_to_user(db: Session, user: UserBase):
-    logger.debug(f"Preparing to send message to user: {user.chat_id}")
-    bot, status = get_bot(db, user.bot_id)
-    if status != 200:
-        logger.error(f"Failed to get bot data, status: {status}")
-        return
+def level_up_markup(lang: str, user_id: UUID):
+    yes_text, no_text = YES_NO_LOCALIZED.get(lang, ("YES", "NO"))
+    return {
+        "inline_keyboard": [[
+            {"text": yes_text, "callback_data": f"{user_id}|t"},
+            {"text": no_text, "callback_data": f"{user_id}|f"},
+        ]]
+    }
 
-    telegram_api_url = f"https://api.telegram.org/bot{b64decode(bot.token).decode()}"
-    url = f"{telegram_api_url}/sendMessage"
-    logger.debug(f"Telegram API URL: {url}")
+def rating_markup(user_id: UUID):
+    return {
+        "inline_keyboard": [[
+            {"text": "🙁", "callback_data": f"{user_id}|1"},
+            {"text": "😕", "callback_data": f"{user_id}|2"},
+            {"text": "🙂", "callback_data": f"{user_id}|3"},
+            {"text": "😄", "callback_data": f"{user_id}|4"},
+            {"text": "🤩", "callback_data": f"{user_id}|5"},
+        ]]
+    }
 
-    messages = get_messages(user.client_level, bot.lang, bot.is_event, user.bot_id)
-    message = next((e for e in messages if e["id"] == user.next_message_id), None)
+def prepare_trace_message(bot, user: UserBase):
+    """Vybere další zprávu trasy a připraví řádek do outboxu (None, pokud se teď posílat nemá)."""
+    message = get_trace_message(user.client_level, bot.lang, bot.is_event, user.bot_id, user.next_message_id)
 
     if message is None:
         logger.warning(f"⚠️ No message found for user {user.chat_id}. Skipping.")
-        return
+        return None, None
 
     logger.debug(f"Message content: {message}")
         
@@ -299,44 +352,43 @@ def send_message_to_user(db: Session, user: UserBase):
             logger.info(f"✅ Čas je správný, odesílám zprávu.")
             should_send = True
 
-    data = {
+    if not should_send:
+        logger.info("Message was not sent due to conditions not being met.")
+        return message, None
+
+    reply_markup = None
+    if message.get("level_up_question"):
+        reply_markup = level_up_markup(bot.lang, user.id)
+    if message.get("rating_question"):
+        reply_markup = rating_markup(user.id)
+
+    # klíč jen pro naplánované zprávy z fronty: po pádu před posunem pozice se zpráva nezařadí podruhé
+    dedup_key = None
+    if user.send_message_at is not None:
+        dedup_key = f"trace:{user.id}:{user.client_level}:{user.next_message_id}:{user.send_message_at.isoformat()}"
+
+    return message, {
+        "bot_id": user.bot_id,
         "chat_id": user.chat_id,
-        "text": replace_variables(db, user.bot_id, user.chat_id, message["content"]),
-        "parse_mode": "html"
+        "text": render_message(bot, user, message["content"]),
+        "reply_markup": reply_markup,
+        "dedup_key": dedup_key,
     }
-    logger.debug(f"Message payload: {data}")
 
-    if message.get("level_up_question"):
-        yes_text, no_text = YES_NO_LOCALIZED.get(bot.lang, ("YES", "NO"))
-        data["reply_markup"] = {
-            "inline_keyboard": [[
-                {"text": yes_text, "callback_data": f"{user.id}|t"},
-                {"text": no_text, "callback_data": f"{user.id}|f"},
-            ]]
-        }
+def send_message_to_user(db: Session, user: UserBase):
+    logger.debug(f"Preparing to send message to user: {user.chat_id}")
+    bot, status = get_bot_snapshot(db, user.bot_id)
+    if status != 200:
+        logger.error(f"Failed to get bot data, status: {status}")
+        return
 
-    if message.get("rating_question"):
-        data["reply_markup"] = {
-            "inline_keyboard": [[
-                {"text": "🙁", "callback_data": f"{user.id}|1"},
-                {"text": "😕", "callback_data": f"{user.id}|2"},
-                {"text": "🙂", "callback_data": f"{user.id}|3"},
-                {"text": "😄", "callback_data": f"{user.id}|4"},
-                {"text": "🤩", "callback_data": f"{user.id}|5"},
-            ]]
-        }
-        
-    if should_send:
-        logger.info("Sending message...")
-        try:
-            response = requests.post(url, json=data)
-            response.raise_for_status()
-            logger.info(f"Message sent successfully to {user.chat_id}")
-        except requests.RequestException as e:
-            logger.error(f"Failed to send message: {e}")
-            return
-    else:
-        logger.info("Message was not sent due to conditions not being met.")
+    message, outbox_row = prepare_trace_message(bot, user)
+    if message is None:
+        return
+
+    if outbox_row:
+        enqueue_message(db, **outbox_row)
+        logger.info(f"Message queued for {user.chat_id}")
 
     logger.info(f"this is next_message_send_after and next_message_id: {message.get('next_message_send_after')}, {message['next_message_id']}")
 
@@ -1,45 +1,56 @@
 from sqlalchemy.orm import Session
 from uuid import UUID
 from typing import Dict
-import os
-from crud.bot import get_bot
-from vokativ import sex, vokativ
+from crud.bot import get_bot_snapshot
+from utils.names import get_vocative_name
 from models.user import User
-from datetime import datetime
-
-def get_user_name(n):
-    if sex(n) == "w":
-        return vokativ(n, woman=True)
-    return vokativ(n, woman=False) 
+from models.bot import Bot
+from utils.templates import render_template
+import logging
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_VALUE = "neznámá hodnota"
+
+def build_context(bot: Bot, user: User) -> Dict[str, str]:
+    # bot i uživatel můžou chybět (smazaný uživatel, neznámý bot), proměnné pak dostanou výchozí hodnoty
+    lang = bot.lang if bot else None
+    name = user.name if user else None
+    if not name:
+        capitalized_name = None
+    elif lang in ("cs", "sk"):
+        capitalized_name = get_vocative_name(name)
+    else:
+        capitalized_name = name[0].upper() + name[1:]
+
+    variables = {
+        "name": capitalized_name or "uživateli",
+        "botName": bot.name if bot and bot.name else "tvůj bot",
+        "supportContact": bot.support_contact if bot and bot.support_contact else "podpora",
+        "network": "https://discord.gg/U5NtgQjg53",
+        "eventName": bot.event_name if bot else None,
+        "eventDate": bot.event_date.strftime("%d. %m. %Y, %H:%M") if bot and bot.event_date else "Datum nenalezeno",
+        "eventLocation": bot.event_location if bot else None,
+        "academyLink": user.academy_link if user else None,
+        "videoLink": f"https://ducknation.vercel.app/video?lang={lang}&id={user.id}" if user else None,
+        "userId": user.id if user else None,
+    }
+
+    return {key: str(value) if value is not None else UNKNOWN_VALUE for key, value in variables.items()}
+
+# renderuje z už načteného bota a uživatele, bez dotazů do DB
+def render_message(bot: Bot, user: User, message: str) -> str:
+    return render_template(message, build_context(bot, user))
 
 # getting correct events by lang 
 def replace_variables(db: Session, bot_id: UUID, chat_id: UUID, message: str):
-    bot, status = get_bot(db, bot_id)
+    bot, status = get_bot_snapshot(db, bot_id)
     user = db.query(User).filter(User.chat_id == chat_id, User.bot_id == bot_id).first()
 
     if not user:
-        print(f"User not found for chat_id: {chat_id}, bot_id: {bot_id}")
-
-    name = get_user_name(user.name) if bot.lang in ("cs", "sk") else user.name
-    capitalized_name = name[0].upper() + name[1:] if name else None
-
-    variables = [
-        {"key": "name", "value": capitalized_name if user and user.name else "uživateli"},
-        {"key": "botName", "value": bot.name if bot and bot.name else "tvůj bot"},
-        {"key": "supportContact", "value": bot.support_contact if bot and bot.support_contact else "podpora"},
-        {"key": "network", "value": "https://discord.gg/U5NtgQjg53"},
-        {"key": "eventName", "value": bot.event_name},
-        {"key": "eventDate", "value": bot.event_date.strftime("%d. %m. %Y, %H:%M") if bot and bot.event_date else "Datum nenalezeno"},
-        {"key": "eventLocation", "value": bot.event_location},
-        {"key": "academyLink", "value": user.academy_link},
-        {"key": "videoLink", "value": f"https://ducknation.vercel.app/video?lang={bot.lang}&id={user.id}"},
-        {"key": "userId", "value": user.id},
-    ]
-
-    for var in variables:
-        message = message.replace(f"{{{var['key']}}}", str(var["value"]) if var["value"] is not None else "neznámá hodnota")
+        logger.warning(f"⚠️ Uživatel nenalezen pro chat_id {chat_id}, bot_id {bot_id}")
 
-    return message.replace("<br>", "\n")
+    return render_message(bot, user, message)
 
 def create_event_string(message: str, time: str, url: str):
     variables = [
@@ -0,0 +1,35 @@
+# crud/webhook.py
+
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from models.webhook import WebhookUpdate
+from uuid import UUID
+from datetime import datetime
+
+def claim_update_statement(bot_id: UUID, update_id: int):
+    return (
+        insert(WebhookUpdate)
+        .values(bot_id=bot_id, update_id=update_id)
+        .on_conflict_do_nothing(index_elements=["bot_id", "update_id"])
+        .returning(WebhookUpdate.update_id)
+    )
+
+def purge_webhook_updates(db: Session, older_than: datetime, batch_size: int) -> int:
+    """Smaže záznamy o zpracovaných updatech starší než older_than, po dávkách."""
+    deleted = 0
+    while True:
+        batch = (
+            select(WebhookUpdate.bot_id, WebhookUpdate.update_id)
+            .where(WebhookUpdate.received_at < older_than)
+            .limit(batch_size)
+        )
+        count = db.execute(
+            delete(WebhookUpdate)
+            .where(tuple_(WebhookUpdate.bot_id, WebhookUpdate.update_id).in_(batch))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
@@ -1,15 +1,96 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import QueuePool, NullPool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from contextlib import contextmanager
 import os
+import time
 from dotenv import load_dotenv
+from utils.metrics import register_collector
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, poolclass=None)
+# "queue" = vlastní pool v procesu, "null" = bez poolu (za PgBouncerem v transaction módu)
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "queue")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+_pool_stats = {"checkouts": 0, "slow_checkouts": 0, "wait_total": 0.0, "wait_max": 0.0, "timeouts": 0}
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool, který měří, jak dlouho se čeká na volné spojení."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            _pool_stats["timeouts"] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            _pool_stats["checkouts"] += 1
+            if waited > 0.001:
+                _pool_stats["slow_checkouts"] += 1
+            _pool_stats["wait_total"] += waited
+            _pool_stats["wait_max"] = max(_pool_stats["wait_max"], waited)
+
+def create_db_engine(url: str = DATABASE_URL):
+    connect_args = {}
+    if DB_STATEMENT_TIMEOUT_MS:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    if DB_POOL_MODE == "null":
+        return create_engine(url, poolclass=NullPool, connect_args=connect_args)
+
+    return create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+def to_async_url(url: str):
+    # stejná databáze, jen přes asyncpg (webhook a dispatcher neblokují event loop)
+    return make_url(url).set(drivername="postgresql+asyncpg")
+
+def create_async_db_engine(url: str = DATABASE_URL):
+    connect_args = {}
+    if DB_STATEMENT_TIMEOUT_MS:
+        connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+
+    if DB_POOL_MODE == "null":
+        # PgBouncer v transaction módu neumí prepared statements
+        connect_args["statement_cache_size"] = 0
+        return create_async_engine(to_async_url(url), poolclass=NullPool, connect_args=connect_args)
+
+    return create_async_engine(
+        to_async_url(url),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_db_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # Dependency
@@ -19,4 +100,36 @@ def get_db():
         yield db
     finally:
         db.close()
-        
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# pro úlohy mimo request (scheduler, startup)
+@contextmanager
+def session_scope():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def get_pool_stats():
+    pool = engine.pool
+    stats = {"mode": DB_POOL_MODE}
+    if isinstance(pool, QueuePool):
+        capacity = DB_POOL_SIZE + DB_MAX_OVERFLOW
+        stats.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "saturation": round(pool.checkedout() / capacity, 2) if capacity else 0.0,
+            **_pool_stats,
+            "wait_avg": round(_pool_stats["wait_total"] / _pool_stats["checkouts"], 4) if _pool_stats["checkouts"] else 0.0,
+        })
+    async_pool = async_engine.pool
+    if isinstance(async_pool, QueuePool):
+        stats["async"] = {"size": async_pool.size(), "checked_out": async_pool.checkedout(), "overflow": max(async_pool.overflow(), 0)}
+    return stats
+
+register_collector("db_pool", get_pool_stats)
@@ -3,30 +3,43 @@
 from fastapi import FastAPI, Depends, Request, BackgroundTasks, Request
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base, SessionLocal
+from database import engine, async_engine, SessionLocal, session_scope
 from schemas.user import UserCreate, UserBase
-from crud.user import get_audience, update_user_name, get_current_user, get_users_in_queue, send_message_to_user, get_user
+from crud.user import get_audience, update_user_name, get_current_user, claim_users_in_queue, release_users_lease, send_message_to_user, get_user
 import os
 import requests
 from dotenv import load_dotenv
 from pydantic import BaseModel
 from fastapi.responses import PlainTextResponse, JSONResponse
 from datetime import datetime, timedelta, timezone as dt_timezone
-from routers.bot import router as bot_router
+from routers.bot import router as bot_router, process_update
 from routers.links import router as links_router
 from routers.sequence import router as sequence_router
 from routers.target import router as target_router
 from routers.telegram import router as telegram_router
+from routers.admin import router as admin_router
 
 from crud.sequence import get_sequences, update_sequence, get_all_sequences
-from crud.vars import replace_variables
 from crud.bot import get_bot
+from crud.rollup import refresh_rollups
+from crud.outbox import purge_outbox
+from crud.webhook import purge_webhook_updates
 from models.bot import Bot, Sequence
 from uuid import UUID
 import logging
 from base64 import b64decode
-from contextlib import contextmanager
-from utils.messages import get_messages
+from utils.messages import get_messages, get_catalog
+from utils.trace_watcher import start_trace_watcher, stop_trace_watcher
+from utils.bot_cache import start_bot_cache_listener, stop_bot_cache_listener
+from utils.names import warm_name_cache
+from utils import telegram_api
+from utils.fanout import fan_out_sequence
+from utils.dispatcher import start_dispatcher, stop_dispatcher
+from utils.webhook_queue import start_webhook_workers, stop_webhook_workers
+from utils.visit_buffer import start_visit_buffer, stop_visit_buffer
+from utils.broadcast_jobs import start_broadcast_worker, stop_broadcast_worker
+from utils.startup import startup_phase
+from migrations import run_migrations
 import uvicorn
 import uuid
 from pytz import timezone as pytz_timezone
@@ -42,17 +55,8 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI()
 
-YES_NO_LOCALIZED = {
-    "cs": ("ANO", "NE"),
-    "sk": ("ÁNO", "NIE"),
-    "en": ("YES", "NO"),
-    "esp": ("SÍ", "NO"),
-}
-
 with open("data/origins.json", "r", encoding="utf-8") as file:
     data = json.load(file)
 
@@ -65,14 +69,28 @@ app.add_middleware(
 )
 
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
-
-@contextmanager
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+RUN_MIGRATIONS = os.getenv("RUN_MIGRATIONS", "1") == "1"
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "100"))
+TRACE_LEASE_SECONDS = int(os.getenv("TRACE_LEASE_SECONDS", "300"))
+ROLLUP_INTERVAL = int(os.getenv("ROLLUP_INTERVAL", "60"))
+# dedup_key obsahuje čas odeslání, ochrana proti dvojímu zařazení tak potřebuje jen minuty historie
+OUTBOX_SENT_RETENTION_DAYS = float(os.getenv("OUTBOX_SENT_RETENTION_DAYS", "7"))
+OUTBOX_FAILED_RETENTION_DAYS = float(os.getenv("OUTBOX_FAILED_RETENTION_DAYS", "30"))
+OUTBOX_PURGE_INTERVAL = int(os.getenv("OUTBOX_PURGE_INTERVAL", "3600"))
+OUTBOX_PURGE_BATCH = int(os.getenv("OUTBOX_PURGE_BATCH", "5000"))
+# Telegram drží nedoručené updaty 24 h, déle není co deduplikovat
+WEBHOOK_DEDUP_RETENTION_HOURS = float(os.getenv("WEBHOOK_DEDUP_RETENTION_HOURS", "48"))
+SUPABASE_EVENTS_URL = "https://lewolqdkbulwiicqkqnk.supabase.co/rest/v1/events?select=*&order=timestamp.asc"
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "15"))
+
+def fetch_events():
+    headers = {
+        "apikey": SUPABASE_ANON_KEY,
+        "Authorization": f"Bearer {SUPABASE_ANON_KEY}"
+    }
+    resp = requests.get(SUPABASE_EVENTS_URL, headers=headers, timeout=SUPABASE_TIMEOUT)
+    resp.raise_for_status()
+    return resp.json()
 
 def format_events(events):
     lines = []
@@ -90,65 +108,45 @@ def format_events(events):
 
 @app.get("/events")
 async def events():
-    headers = {
-        "apikey": SUPABASE_ANON_KEY,
-        "Authorization": f"Bearer {SUPABASE_ANON_KEY}"
-    }
-
-    url = "https://lewolqdkbulwiicqkqnk.supabase.co/rest/v1/events?select=*&order=timestamp.asc"
-    resp = requests.get(url, headers=headers)
-    resp.raise_for_status()
-    events_data = resp.json()
+    events_data = fetch_events()
     formatted_text = format_events(events_data)
     return PlainTextResponse(content=formatted_text)
 
-def send_sequence_to_user(db: Session, bot_id: UUID, chat_id: int, message: str, check_status: bool):
-    bot, status = get_bot(db, bot_id)
-    telegram_api_url = f"https://api.telegram.org/bot{b64decode(bot.token).decode()}"
-    url = f"{telegram_api_url}/sendMessage"
-
-    user = get_current_user(db, chat_id, bot_id)
-    if not user:
-        print("user not found")
-
-    data = {
-        "chat_id": chat_id,
-        "text": replace_variables(db, bot_id, chat_id, message),
-        "parse_mode": "html"
-    }
-
-    if check_status:
-        yes_text, no_text = YES_NO_LOCALIZED.get(bot.lang, ("YES", "NO"))
-        data["reply_markup"] = {
-            "inline_keyboard": [[
-                {"text": yes_text, "callback_data": f"{user.id}|t"},
-                {"text": no_text, "callback_data": f"{user.id}|f"},
-            ]]
-        }
-
-
-    response = requests.post(url, json=data)
-    response.raise_for_status()
-
-async def process_customers_trace():
+# synchronní úloha, BackgroundTasks ji pustí v threadpoolu mimo event loop
+def process_customers_trace():
     logger.info("✅ Spouštím úlohu process_customers_trace")
     db = SessionLocal()
+    processed = 0
+    after = None
     try:
-        users = get_users_in_queue(db)
-        logger.info(f"🔍 Nalezeno {len(users)} uživatelů ke zpracování.")
-        for user in users:
-            send_message_to_user(db, user)
+        while True:
+            users = claim_users_in_queue(db, TRACE_BATCH_SIZE, TRACE_LEASE_SECONDS, after)
+            if not users:
+                break
+            logger.info(f"🔍 Zabráno {len(users)} uživatelů ke zpracování.")
+            try:
+                for user in users:
+                    try:
+                        send_message_to_user(db, user)
+                    except Exception as e:
+                        db.rollback()
+                        logger.error(f"❌ Chyba při zpracování uživatele {user.id}: {str(e)}")
+            finally:
+                release_users_lease(db, users)
+            after = (users[-1].send_message_at, users[-1].id)
+            processed += len(users)
     except Exception as e:
         logger.error(f"❌ Chyba při zpracování uživatelů: {str(e)}")
     finally:
         db.close()
+    logger.info(f"✅ Fronta zpracována, uživatelů: {processed}")
 
 @app.post("/run-customers-trace")
 async def run_customers_trace(background_tasks: BackgroundTasks):
     background_tasks.add_task(process_customers_trace)
     return {"status": "ok", "message": "Zpracování spuštěno"}
 
-async def process_sequences():
+def process_sequences():
     db = SessionLocal()
     logger.info("✅ Spouštím úlohu process_sequences")
 
@@ -159,14 +157,11 @@ async def process_sequences():
             return
 
         for sequence in sequences:
-            users = get_audience(db, sequence.bot_id, sequence.levels)
-            if not users:
+            stats = fan_out_sequence(db, sequence)
+            if not stats["total"]:
                 logger.warning(f"⚠️ Žádní uživatelé pro sekvenci {sequence.id}")
                 continue
 
-            for user in users:
-                send_sequence_to_user(db, sequence.bot_id, user.chat_id, sequence.message, sequence.check_status)
-
             if sequence.repeat and sequence.interval:
                 updated_date = sequence.send_at + timedelta(days=sequence.interval)
                 update_sequence(db, sequence.id, {"send_at": updated_date, "starts_at": updated_date, "send_immediately": False})
@@ -178,6 +173,32 @@ async def process_sequences():
     finally:
         db.close()
 
+def process_rollups():
+    db = SessionLocal()
+    try:
+        result = refresh_rollups(db)
+        logger.info(f"📊 Rollupy statistik aktualizovány: {result}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Chyba při aktualizaci rollupů: {e}")
+    finally:
+        db.close()
+
+def process_outbox_retention():
+    db = SessionLocal()
+    try:
+        now = datetime.now(dt_timezone.utc)
+        sent = purge_outbox(db, "sent", now - timedelta(days=OUTBOX_SENT_RETENTION_DAYS), OUTBOX_PURGE_BATCH)
+        failed = purge_outbox(db, "failed", now - timedelta(days=OUTBOX_FAILED_RETENTION_DAYS), OUTBOX_PURGE_BATCH)
+        updates = purge_webhook_updates(db, now - timedelta(hours=WEBHOOK_DEDUP_RETENTION_HOURS), OUTBOX_PURGE_BATCH)
+        if sent or failed or updates:
+            logger.info(f"🧹 Outbox pročištěn: {sent} odeslaných, {failed} neúspěšných zpráv, {updates} záznamů webhooků")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Chyba při čištění outboxu: {e}")
+    finally:
+        db.close()
+
 @app.post("/run-sequences")
 async def run_sequences(background_tasks: BackgroundTasks):
     background_tasks.add_task(process_sequences)
@@ -198,24 +219,19 @@ def create_event_sequences():
                 Bot.lang == "sk"
             )
         ).all()
-    
+        if not bots:
+            return
+
+        # eventy jsou pro všechny boty stejné, stačí jeden request
+        events = fetch_events()
         for bot in bots:
-            generate_sequences_for_bot(db, bot)
+            generate_sequences_for_bot(db, bot, events)
     except Exception as e:
         logger.error(f"❌ Chyba při vytváření event sekvencí: {e}")
     finally:
         db.close()
 
-def generate_sequences_for_bot(db: Session, bot: Bot):
-    headers = {
-        "apikey": SUPABASE_ANON_KEY,
-        "Authorization": f"Bearer {SUPABASE_ANON_KEY}"
-    }
-
-    SUPABASE_URL = "https://lewolqdkbulwiicqkqnk.supabase.co/rest/v1/events?select=*&order=timestamp.asc"
-    resp = requests.get(SUPABASE_URL, headers=headers)
-    events = resp.json()
-
+def generate_sequences_for_bot(db: Session, bot: Bot, events):
     existing_sequences, _ = get_all_sequences(db, bot.id)
     for seq in existing_sequences:
         if "Event" in seq.name:
@@ -266,17 +282,56 @@ def generate_sequences_for_bot(db: Session, bot: Bot):
 
 scheduler = BackgroundScheduler()
 scheduler.add_job(create_event_sequences, CronTrigger(day_of_week="mon", hour=10, minute=0))
+scheduler.add_job(process_rollups, "interval", seconds=ROLLUP_INTERVAL, max_instances=1, coalesce=True)
+scheduler.add_job(process_outbox_retention, "interval", seconds=OUTBOX_PURGE_INTERVAL, max_instances=1, coalesce=True)
+
+def warm_names():
+    with session_scope() as db:
+        try:
+            warm_name_cache(db)
+        except Exception as e:
+            logger.error(f"❌ Chyba při předehřátí cache oslovení: {e}")
 
 @app.on_event("startup")
 def start_scheduler():
-    scheduler.start()
-    create_event_sequences()
+    if RUN_MIGRATIONS:
+        with startup_phase("migrations"):
+            run_migrations(engine)
+    with startup_phase("catalog"):
+        get_catalog()
+    with startup_phase("listeners"):
+        start_trace_watcher()
+        start_bot_cache_listener()
+    with startup_phase("scheduler"):
+        scheduler.start()
+        # mimo kritickou cestu: API obsluhuje hned, cache oslovení a sekvence eventů doběhnou ve scheduleru
+        scheduler.add_job(warm_names)
+        scheduler.add_job(create_event_sequences)
+
+@app.on_event("startup")
+async def start_async_workers():
+    start_webhook_workers(process_update)
+    start_dispatcher()
+    start_visit_buffer()
+    start_broadcast_worker()
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    stop_trace_watcher()
+    stop_bot_cache_listener()
+    await stop_webhook_workers()
+    await stop_broadcast_worker()
+    await stop_visit_buffer()
+    await stop_dispatcher()
+    await telegram_api.close_client()
+    await async_engine.dispose()
 
 app.include_router(bot_router, prefix="/api/bot", tags=["Bots"])
 app.include_router(sequence_router, prefix="/api/bot/sequence", tags=["Sequences"])
 app.include_router(links_router, prefix="/api/bot/academy-link", tags=["Academy Links"])
 app.include_router(target_router, prefix="/api/bot/target", tags=["Target"])
 app.include_router(telegram_router, prefix="/api/telegram", tags=["Telegram"])
+app.include_router(admin_router, prefix="/api/admin", tags=["Admin"])
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
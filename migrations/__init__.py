@@ -0,0 +1,207 @@
+# migrations/__init__.py
+#
+# Jednoduchý runner migrací místo Base.metadata.create_all při importu.
+# Každá migrace má verzi a funkci upgrade(connection); aplikované verze se drží v tabulce schema_migrations.
+
+import os
+import re
+import time
+import logging
+from sqlalchemy import text
+from sqlalchemy.engine import Engine, Connection
+
+from database import Base
+import models.bot  # noqa: F401 – registrace tabulek v Base.metadata
+import models.user  # noqa: F401
+import models.outbox  # noqa: F401
+import models.rollup  # noqa: F401
+import models.broadcast  # noqa: F401
+import models.webhook  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+# libovolné, ale stálé číslo pro pg_advisory_lock, aby migrace nespouštělo víc workerů naráz
+MIGRATIONS_LOCK_KEY = 724_118_001
+# ostatní workery zámek jen zkoušejí: čekání uvnitř pg_advisory_lock drží snapshot a CREATE INDEX CONCURRENTLY by na něj čekal
+MIGRATIONS_LOCK_POLL_INTERVAL = float(os.getenv("MIGRATIONS_LOCK_POLL_INTERVAL", "1"))
+
+def baseline(connection: Connection):
+    # vytvoří chybějící tabulky podle modelů; existující tabulky nechá být
+    Base.metadata.create_all(bind=connection)
+
+def users_queue_lease(connection: Connection):
+    connection.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS queue_lease_until TIMESTAMPTZ"))
+
+HOT_PATH_INDEXES = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_bot_id_chat_id ON users (bot_id, chat_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_bot_id_client_level ON users (bot_id, client_level)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_bot_id_created_at ON users (bot_id, created_at)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_send_message_at_pending ON users (send_message_at) WHERE send_message_at IS NOT NULL",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sequence_is_active_send_at ON sequence (is_active, send_at)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sequence_bot_id ON sequence (bot_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_analytic_data_bot_id_created_at ON analytic_data (bot_id, created_at)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_list_bot_id ON list (bot_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bots_name ON bots (name)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bots_event_name ON bots (event_name)",
+]
+
+def drop_invalid_index(connection: Connection, name: str):
+    # přerušený CREATE INDEX CONCURRENTLY nechá INVALID index, IF NOT EXISTS by ho už nikdy neopravil
+    invalid = connection.execute(text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid) AND NOT i.indisvalid"
+    ), {"name": name}).first()
+    if invalid:
+        logger.warning(f"⚠️ Index {name} je INVALID, zakládám ho znovu")
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+def hot_path_indexes(connection: Connection):
+    for statement in HOT_PATH_INDEXES:
+        drop_invalid_index(connection, re.search(r"IF NOT EXISTS (\w+)", statement).group(1))
+        connection.execute(text(statement))
+
+USER_LEVEL_CHANGES_TRIGGER = """
+CREATE OR REPLACE FUNCTION log_user_level_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO user_level_changes (op, bot_id, created_bucket, from_level, to_level)
+        VALUES ('insert', NEW.bot_id, date_trunc('hour', COALESCE(NEW.created_at, now()), 'UTC'), NULL, COALESCE(NEW.client_level, -1));
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO user_level_changes (op, bot_id, created_bucket, from_level, to_level)
+        VALUES ('delete', OLD.bot_id, date_trunc('hour', COALESCE(OLD.created_at, now()), 'UTC'), COALESCE(OLD.client_level, -1), NULL);
+    ELSIF NEW.client_level IS DISTINCT FROM OLD.client_level THEN
+        INSERT INTO user_level_changes (op, bot_id, created_bucket, from_level, to_level)
+        VALUES ('update', NEW.bot_id, date_trunc('hour', COALESCE(OLD.created_at, now()), 'UTC'), COALESCE(OLD.client_level, -1), COALESCE(NEW.client_level, -1));
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+def hourly_rollups(connection: Connection):
+    Base.metadata.create_all(bind=connection, tables=[
+        models.rollup.AnalyticHourly.__table__,
+        models.rollup.UserCohortHourly.__table__,
+        models.rollup.LevelTransitionHourly.__table__,
+        models.rollup.UserLevelChange.__table__,
+        models.rollup.RollupState.__table__,
+    ])
+    # zámek blokuje zápisy do users, než trigger a backfill kohort doběhnou ve stejné transakci
+    connection.execute(text("LOCK TABLE users IN SHARE ROW EXCLUSIVE MODE"))
+    connection.execute(text(USER_LEVEL_CHANGES_TRIGGER))
+    connection.execute(text("DROP TRIGGER IF EXISTS users_level_changes ON users"))
+    connection.execute(text(
+        "CREATE TRIGGER users_level_changes AFTER INSERT OR DELETE OR UPDATE OF client_level ON users "
+        "FOR EACH ROW EXECUTE FUNCTION log_user_level_change()"
+    ))
+    connection.execute(text("TRUNCATE user_cohort_hourly, user_level_changes"))
+    connection.execute(text(
+        "INSERT INTO user_cohort_hourly (bot_id, bucket, client_level, users) "
+        "SELECT bot_id, date_trunc('hour', COALESCE(created_at, now()), 'UTC'), COALESCE(client_level, -1), count(*) "
+        "FROM users GROUP BY 1, 2, 3"
+    ))
+    # návštěvy doplní první běh úlohy rollupů od nulového watermarku
+    connection.execute(text(
+        "INSERT INTO rollup_state (name, watermark) VALUES ('analytic_hourly', NULL) ON CONFLICT (name) DO NOTHING"
+    ))
+
+def list_current_weight(connection: Connection):
+    # DEFAULT bez přepisu tabulky (PostgreSQL 11+)
+    connection.execute(text("ALTER TABLE list ADD COLUMN IF NOT EXISTS current_weight DOUBLE PRECISION NOT NULL DEFAULT 0"))
+
+def broadcast_jobs(connection: Connection):
+    Base.metadata.create_all(bind=connection, tables=[
+        models.broadcast.BroadcastJob.__table__,
+        models.broadcast.BroadcastRecipient.__table__,
+    ])
+
+def contact_sync_state(connection: Connection):
+    Base.metadata.create_all(bind=connection, tables=[models.broadcast.ContactSyncState.__table__])
+
+def broadcast_file_sha256(connection: Connection):
+    connection.execute(text("ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS file_sha256 VARCHAR"))
+
+def contact_sync_pending(connection: Connection):
+    connection.execute(text("ALTER TABLE contact_sync_state ADD COLUMN IF NOT EXISTS pending JSONB NOT NULL DEFAULT '[]'"))
+
+def analytic_data_inserted_at(connection: Connection):
+    # watermark se zamyká první, ve stejném pořadí jako úloha rollupů (jinak deadlock s ALTER TABLE)
+    watermark = connection.execute(text(
+        "SELECT watermark FROM rollup_state WHERE name = 'analytic_hourly' FOR UPDATE"
+    )).scalar()
+    # bez DEFAULT v ADD COLUMN zůstanou staré řádky NULL bez přepisu tabulky; NULL = přelito podle created_at
+    connection.execute(text("ALTER TABLE analytic_data ADD COLUMN IF NOT EXISTS inserted_at TIMESTAMPTZ"))
+    connection.execute(text("ALTER TABLE analytic_data ALTER COLUMN inserted_at SET DEFAULT now()"))
+    if watermark is not None:
+        # návštěvy za watermarkem ještě v rollupu nejsou, přelijí se podle nového sloupce
+        connection.execute(text(
+            "UPDATE analytic_data SET inserted_at = now() WHERE inserted_at IS NULL AND created_at >= :watermark"
+        ), {"watermark": watermark})
+
+def analytic_data_inserted_at_index(connection: Connection):
+    drop_invalid_index(connection, "ix_analytic_data_inserted_at")
+    connection.execute(text("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_analytic_data_inserted_at ON analytic_data (inserted_at)"))
+
+def outbox_dedup_key_prefix_index(connection: Connection):
+    drop_invalid_index(connection, "ix_outbox_dedup_key_prefix")
+    connection.execute(text(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_outbox_dedup_key_prefix ON outbox (dedup_key text_pattern_ops)"
+    ))
+
+def webhook_updates(connection: Connection):
+    Base.metadata.create_all(bind=connection, tables=[models.webhook.WebhookUpdate.__table__])
+
+def list_current_weight_integer(connection: Connection):
+    # float váhy se nedají přesně převést, round-robin začne nový cyklus od nuly
+    connection.execute(text("ALTER TABLE list ALTER COLUMN current_weight TYPE BIGINT USING 0"))
+
+# (verze, upgrade, concurrent) – concurrent migrace běží v autocommitu, CREATE INDEX CONCURRENTLY nesmí být v transakci
+MIGRATIONS = [
+    ("0001_baseline", baseline, False),
+    ("0002_users_queue_lease", users_queue_lease, False),
+    ("0003_hot_path_indexes", hot_path_indexes, True),
+    ("0004_hourly_rollups", hourly_rollups, False),
+    ("0005_list_current_weight", list_current_weight, False),
+    ("0006_broadcast_jobs", broadcast_jobs, False),
+    ("0007_contact_sync_state", contact_sync_state, False),
+    ("0008_broadcast_file_sha256", broadcast_file_sha256, False),
+    ("0009_contact_sync_pending", contact_sync_pending, False),
+    ("0010_analytic_data_inserted_at", analytic_data_inserted_at, False),
+    ("0011_analytic_data_inserted_at_index", analytic_data_inserted_at_index, True),
+    ("0012_outbox_dedup_key_prefix_index", outbox_dedup_key_prefix_index, True),
+    ("0013_webhook_updates", webhook_updates, False),
+    ("0014_list_current_weight_integer", list_current_weight_integer, False),
+]
+
+def get_applied_versions(connection: Connection):
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version VARCHAR PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+    ))
+    return {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+
+def run_migrations(engine: Engine):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_connection:
+        waiting = False
+        while not lock_connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY}).scalar():
+            if not waiting:
+                logger.info("⏳ Migrace právě spouští jiný worker, čekám")
+                waiting = True
+            time.sleep(MIGRATIONS_LOCK_POLL_INTERVAL)
+        try:
+            applied = get_applied_versions(lock_connection)
+            pending = [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+            for version, upgrade, concurrent in pending:
+                logger.info(f"🛠️ Aplikuji migraci {version}")
+                if concurrent:
+                    upgrade(lock_connection)
+                    lock_connection.execute(text("INSERT INTO schema_migrations (version) VALUES (:version)"), {"version": version})
+                else:
+                    with engine.begin() as connection:
+                        upgrade(connection)
+                        connection.execute(text("INSERT INTO schema_migrations (version) VALUES (:version)"), {"version": version})
+
+            return [migration[0] for migration in pending]
+        finally:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
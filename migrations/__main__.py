@@ -0,0 +1,11 @@
+# python -m migrations
+
+import logging
+from database import engine
+from migrations import run_migrations
+
+logging.basicConfig(level=logging.INFO)
+
+if __name__ == "__main__":
+    applied = run_migrations(engine)
+    print(f"✅ Aplikované migrace: {applied or 'žádné'}")
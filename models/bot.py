@@ -1,6 +1,6 @@
 # models/bot.py
 
-from sqlalchemy import Column, BigInteger, Boolean, String, Integer, ARRAY, Integer, DateTime, Float
+from sqlalchemy import Column, BigInteger, Boolean, String, Integer, ARRAY, Integer, DateTime, Float, Index
 from database import Base
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
@@ -29,6 +29,11 @@ class Bot(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_bots_name", "name"),
+        Index("ix_bots_event_name", "event_name"),
+    )
+
 class Sequence(Base):
     __tablename__ = "sequence"
 
@@ -48,6 +53,11 @@ class Sequence(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_sequence_is_active_send_at", "is_active", "send_at"),
+        Index("ix_sequence_bot_id", "bot_id"),
+    )
+
 class BotList(Base):
     __tablename__ = "list"
 
@@ -56,15 +66,28 @@ class BotList(Base):
     position = Column(Integer, nullable=True)
     share = Column(Float, nullable=True)
     currently_assigned = Column(Integer, nullable=True)
+    # stav smooth weighted round-robin v jednotkách share * LINK_SHARE_SCALE, viz crud/aio/links.ALLOCATE_LINK
+    current_weight = Column(BigInteger, nullable=False, default=0, server_default="0")
     parent = Column(String, nullable=True)
     child = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_list_bot_id", "bot_id"),
+    )
+
 class AnalyticData(Base):
     __tablename__ = "analytic_data"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     bot_id = Column(UUID(as_uuid=True), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # čas zápisu do DB; created_at je čas návštěvy a flush z bufferu se může opozdit
+    inserted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_analytic_data_bot_id_created_at", "bot_id", "created_at"),
+        Index("ix_analytic_data_inserted_at", "inserted_at"),
+    )
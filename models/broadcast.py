@@ -0,0 +1,68 @@
+# models/broadcast.py
+
+from sqlalchemy import Column, BigInteger, String, Integer, DateTime, Index
+from database import Base
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+import uuid
+from sqlalchemy.sql import func
+
+class BroadcastJob(Base):
+    """Broadcast přes uživatelský Telegram účet, zpracovává ho worker na pozadí."""
+    __tablename__ = "broadcast_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # "all" = všechny kontakty, "new" = jen nově přidané z dialogů
+    mode = Column(String, nullable=False, default="all")
+    # queued -> running -> done | failed; session se po doběhnutí maže
+    status = Column(String, nullable=False, default="queued")
+    session = Column(String, nullable=True)
+    message = Column(String, nullable=False)
+    lang = Column(String, nullable=True)
+    file_path = Column(String, nullable=True)
+    file_name = Column(String, nullable=True)
+    file_mime = Column(String, nullable=True)
+    file_sha256 = Column(String, nullable=True)
+    total = Column(Integer, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    lease_until = Column(DateTime(timezone=True), nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_broadcast_jobs_status_lease_until", "status", "lease_until"),
+    )
+
+class BroadcastRecipient(Base):
+    """Checkpoint broadcastu: stav každého příjemce (pending -> sending -> sent | failed)."""
+    __tablename__ = "broadcast_recipients"
+
+    job_id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    access_hash = Column(BigInteger, nullable=False)
+    first_name = Column(String, nullable=True)
+    username = Column(String, nullable=True)
+    position = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    error = Column(String, nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_broadcast_recipients_job_id_status_position", "job_id", "status", "position"),
+    )
+
+class ContactSyncState(Base):
+    """Naposledy synchronizované kontakty účtu, klíčem je hash session (session samotná se neukládá)."""
+    __tablename__ = "contact_sync_state"
+
+    session_key = Column(String, primary_key=True)
+    # [{user_id, access_hash, first_name, username, bot}, ...]
+    contacts = Column(JSONB, nullable=False, default=list)
+    saved_count = Column(Integer, nullable=False, default=0)
+    contacts_hash = Column(BigInteger, nullable=True)
+    # lidé z už prošlých dialogů, které se nepodařilo přidat do kontaktů – další sync je zkusí znovu
+    pending = Column(JSONB, nullable=False, default=list, server_default="[]")
+    # datum poslední zprávy nejnovějšího zpracovaného dialogu
+    dialogs_synced_at = Column(DateTime(timezone=True), nullable=True)
+    synced_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
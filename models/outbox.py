@@ -0,0 +1,31 @@
+# models/outbox.py
+
+from sqlalchemy import Column, BigInteger, String, Integer, DateTime, Index
+from database import Base
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+import uuid
+from sqlalchemy.sql import func
+
+class Outbox(Base):
+    __tablename__ = "outbox"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    bot_id = Column(UUID(as_uuid=True), nullable=False)
+    chat_id = Column(BigInteger, nullable=False)
+    text = Column(String, nullable=False)
+    reply_markup = Column(JSONB, nullable=True)
+    parse_mode = Column(String, nullable=True, default="html")
+    dedup_key = Column(String, nullable=True, unique=True)
+    state = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    last_error = Column(String, nullable=True)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_outbox_state_next_attempt_at", "state", "next_attempt_at"),
+        # LIKE 'seq:<id>:%' pro doručenost sekvence; běžný index na dedup_key prefix nepoužije
+        Index("ix_outbox_dedup_key_prefix", "dedup_key", postgresql_ops={"dedup_key": "text_pattern_ops"}),
+    )
@@ -0,0 +1,56 @@
+# models/rollup.py
+
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Index
+from database import Base
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+
+# hodinové součty pro dashboard; bucket = začátek hodiny v UTC
+
+class AnalyticHourly(Base):
+    __tablename__ = "analytic_hourly"
+
+    bot_id = Column(UUID(as_uuid=True), primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    visits = Column(BigInteger, nullable=False, default=0)
+
+class UserCohortHourly(Base):
+    """Uživatelé podle hodiny registrace a jejich aktuálního levelu (NULL level = -1)."""
+    __tablename__ = "user_cohort_hourly"
+
+    bot_id = Column(UUID(as_uuid=True), primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    client_level = Column(Integer, primary_key=True)
+    users = Column(BigInteger, nullable=False, default=0)
+
+class LevelTransitionHourly(Base):
+    __tablename__ = "level_transition_hourly"
+
+    bot_id = Column(UUID(as_uuid=True), primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    from_level = Column(Integer, primary_key=True)
+    to_level = Column(Integer, primary_key=True)
+    transitions = Column(BigInteger, nullable=False, default=0)
+
+class UserLevelChange(Base):
+    """Log změn plněný triggerem na users; úloha rollupů ho průběžně přelévá do součtů a maže."""
+    __tablename__ = "user_level_changes"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    op = Column(String, nullable=False)
+    bot_id = Column(UUID(as_uuid=True), nullable=False)
+    created_bucket = Column(DateTime(timezone=True), nullable=False)
+    from_level = Column(Integer, nullable=True)
+    to_level = Column(Integer, nullable=True)
+    changed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_user_level_changes_bot_id_created_bucket", "bot_id", "created_bucket"),
+    )
+
+class RollupState(Base):
+    __tablename__ = "rollup_state"
+
+    name = Column(String, primary_key=True)
+    watermark = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,6 +1,6 @@
 # models/user.py
 
-from sqlalchemy import Column, BigInteger, Boolean, String, Integer, DateTime
+from sqlalchemy import Column, BigInteger, Boolean, String, Integer, DateTime, Index
 from database import Base
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
@@ -16,6 +16,7 @@ class User(Base):
     chat_id = Column(BigInteger, nullable=False)
     client_level = Column(Integer, default=0)
     send_message_at = Column(DateTime(timezone=True), nullable=True)
+    queue_lease_until = Column(DateTime(timezone=True), nullable=True)
     next_message_id = Column(Integer, default=0)
     reference = Column(String, nullable=True)
     rating = Column(Integer, default=0)
@@ -24,6 +25,13 @@ class User(Base):
     username = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_users_bot_id_chat_id", "bot_id", "chat_id"),
+        Index("ix_users_bot_id_client_level", "bot_id", "client_level"),
+        Index("ix_users_bot_id_created_at", "bot_id", "created_at"),
+        Index("ix_users_send_message_at_pending", "send_message_at", postgresql_where=send_message_at.isnot(None)),
+    )
     
 class Target(Base):
     __tablename__ = "target"
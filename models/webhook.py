@@ -0,0 +1,18 @@
+# models/webhook.py
+
+from sqlalchemy import Column, BigInteger, DateTime, Index
+from database import Base
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+
+class WebhookUpdate(Base):
+    """Zpracované updaty Telegramu; primární klíč brání dvojímu zpracování napříč procesy i po restartu."""
+    __tablename__ = "webhook_updates"
+
+    bot_id = Column(UUID(as_uuid=True), primary_key=True)
+    update_id = Column(BigInteger, primary_key=True)
+    received_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_webhook_updates_received_at", "received_at"),
+    )
@@ -0,0 +1,35 @@
+# routers/admin.py
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from uuid import UUID
+from database import get_db
+from security import verify_admin
+from utils.fanout import get_sequence_delivery
+from utils.messages import reload_catalog, get_catalog_info
+from utils.names import get_name_cache_stats
+from utils.metrics import collect
+
+# metriky a reload katalogu jen s admin tokenem (Authorization: Bearer <ADMIN_TOKEN>)
+router = APIRouter(dependencies=[Depends(verify_admin)])
+
+@router.get("/metrics")
+def fetch_metrics():
+    return collect()
+
+@router.get("/traces")
+def fetch_traces_info():
+    return get_catalog_info()
+
+@router.post("/traces/reload")
+def reload_traces():
+    reload_catalog()
+    return {"status": "ok", **get_catalog_info()}
+
+@router.get("/names/cache")
+def fetch_name_cache_stats():
+    return get_name_cache_stats()
+
+@router.get("/sequences/{sequence_id}/delivery")
+def fetch_sequence_delivery(sequence_id: UUID, db: Session = Depends(get_db)):
+    return get_sequence_delivery(db, sequence_id)
@@ -1,17 +1,20 @@
 # routers/bot.py
 
+from anyio import from_thread
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db, get_async_db, AsyncSessionLocal
 from schemas.bot import SignIn, SignInResponse, SignUp, UpdateBot, Statistic, PublicBot
-from crud.bot import sign_in, sign_up, get_bot_by_name, get_bot, verify_token, update_bot, get_statistics, get_public_bot, increase_analytic_data
-from crud.user import get_current_user, update_user_name, update_users_academy_link, get_user, create_user, update_users_level, send_message_to_user, update_rating, update_reference, get_references, get_all_public_users, delete_users
+from crud.bot import sign_in, sign_up, get_bot_url, get_bot_by_name, get_bot, get_bot_snapshot, verify_token, update_bot, get_statistics, get_public_bot
+from crud.user import get_all_public_users, delete_users
+from crud.aio import user as aio_user
+from crud.aio import bot as aio_bot
+from crud.aio.links import assign_academy_link
+from crud.aio.webhook import claim_update
 from crud.sequence import create_staking_sequences
-from crud.vars import replace_variables
-from crud.links import get_all_links, update_link
 from schemas.user import UserCreate, PublicUser, DeleteUsersRequest
-from schemas.links import UpdateLink
 from models.user import User
 from models.bot import Sequence
 from base64 import b64encode, b64decode
@@ -19,9 +22,11 @@ import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from typing import List, Dict, Literal, Any
-import requests
+from utils import telegram_api
+from utils.webhook_queue import enqueue_update, record_ack
+from utils.visit_buffer import resolve_bot_id, record_visit
 from uuid import UUID
-import random
+import time
 import logging
 from typing import Optional
 
@@ -37,46 +42,6 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-def reset_all_links(db: Session, bot_id: UUID):
-    links, status = get_all_links(db, bot_id)
-    if status != 200 or not links:
-        return
-
-    for link_schema in links:
-        update_link(db, link_schema.id, UpdateLink(currently_assigned=0))
-        
-def assing_academy_link(db: Session, bot_id: UUID, user_id: UUID):
-    links, status = get_all_links(db, bot_id)
-    links_length = len(links)
-
-    if not links or status != 200:
-        return
-
-    if all(link.currently_assigned == link.share for link in links):
-        reset_all_links(db, bot_id)
-
-    while True:
-        random_number = random.randint(0, links_length - 1)
-        link = links[random_number]
-        if link.currently_assigned < link.share:
-            update_users_academy_link(db, user_id, link.child)
-            update_link(db, link.id, UpdateLink(currently_assigned=link.currently_assigned + 1))
-            break
-
-    link = links[random_number]
-    if link.currently_assigned < link.share:
-        update_users_academy_link(db, user_id, link.child)
-        update_link(db, link.id, UpdateLink(currently_assigned=link.currently_assigned + 1))
-    else:
-        assing_academy_link(db, bot_id, user_id)
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def format_events(events):
     lines = []
     for e in events:
@@ -97,7 +62,9 @@ def create_bot(sign_up_body: SignUp, db: Session = Depends(get_db)):
     if status == 200:
         raise HTTPException(status_code=400, detail="Tento bot už existuje!")
 
-    bot_id, sign_up_status = sign_up(db, sign_up_body)
+    # sync route běží v threadpoolu, sdílený async klient Telegramu se volá na event loopu
+    bot_url = from_thread.run(get_bot_url, sign_up_body.token)
+    bot_id, sign_up_status = sign_up(db, sign_up_body, bot_url)
     if sign_up_status != 200:
         raise HTTPException(status_code=400, detail="Stala se chyba při vytváření bota.")
     create_staking_sequences(db, bot_id, sign_up_body.lang)
@@ -142,7 +109,7 @@ def fetch_bot(name: str, db: Session = Depends(get_db)):
 
 @router.get("/{bot_id}/support-contact")
 def fetch_bot(bot_id: UUID, db: Session = Depends(get_db)):
-    db_bot, status = get_bot(db, bot_id)
+    db_bot, status = get_bot_snapshot(db, bot_id)
 
     if status == 404:
         raise HTTPException(status_code=404, detail="Tento bot neexistuje!")
@@ -150,94 +117,103 @@ def fetch_bot(bot_id: UUID, db: Session = Depends(get_db)):
     return { "support_contact": db_bot.support_contact }
 
 @router.post("/{bot_id}/set-webhook")
-async def set_webhook(bot_id: UUID, db: Session = Depends(get_db)):
-    bot, status = get_bot(db, bot_id)
-    telegram_api_url = f"https://api.telegram.org/bot{b64decode(bot.token).decode()}"
+async def set_webhook(bot_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    bot, status = await aio_bot.get_bot_snapshot(db, bot_id)
+    token = bot.api_token
 
     if DOMAIN:
         callback_url = f"{DOMAIN}/bot/{bot_id}/webhook"
-        get_info_url = f"{telegram_api_url}/getWebhookInfo"
-        info_response = requests.get(get_info_url)
-        if info_response.status_code == 200:
-            info_data = info_response.json()
-            if info_data.get("ok") and info_data["result"].get("url") == callback_url:
+        try:
+            info = await telegram_api.get_webhook_info(token)
+            if info.get("url") == callback_url:
                 print("Webhook is already set!")
                 return callback_url
+        except telegram_api.TelegramAPIError as e:
+            print("Failed to get webhook info:", e)
 
-        webhook_url = f"{telegram_api_url}/setWebhook"
-        response = requests.post(webhook_url, data={"url": callback_url})
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("ok") and data.get("result") is True:
+        try:
+            if await telegram_api.set_webhook(token, callback_url) is True:
                 print("Webhook successfully set!")
             else:
-                print("Failed to set webhook:", data)
-        else:
-            print("Failed to set webhook:", response.text)
+                print("Failed to set webhook.")
+        except telegram_api.TelegramAPIError as e:
+            print("Failed to set webhook:", e.description)
     else:
         print("No DOMAIN set, cannot set webhook.")
 
 @router.delete("/{bot_id}/delete-webhook")
-async def delete_webhook(bot_id: UUID, db: Session = Depends(get_db)):
-    bot, status = get_bot(db, bot_id)
+async def delete_webhook(bot_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    bot, status = await aio_bot.get_bot_snapshot(db, bot_id)
     if status != 200:
         raise HTTPException(status_code=404, detail="Bot not found.")
 
-    telegram_api_url = f"https://api.telegram.org/bot{b64decode(bot.token).decode()}"
+    token = bot.api_token
 
     if DOMAIN:
-        webhook_url = f"{telegram_api_url}/deleteWebhook"
-        response = requests.post(webhook_url)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("ok"):
-                return {"detail": "Webhook successfully deleted!"}
-            else:
-                raise HTTPException(status_code=400, detail=f"Failed to delete webhook: {data.get('description', 'Unknown error')}")
-        else:
-            raise HTTPException(status_code=response.status_code, detail=f"Failed to delete webhook: {response.text}")
+        try:
+            await telegram_api.delete_webhook(token)
+        except telegram_api.TelegramAPIError as e:
+            raise HTTPException(status_code=e.status_code or 400, detail=f"Failed to delete webhook: {e.description}")
+        return {"detail": "Webhook successfully deleted!"}
     else:
         raise HTTPException(status_code=400, detail="No DOMAIN set, cannot delete webhook.")
 
 @router.get("/{bot_id}/webhook-info")
-async def get_webhook_info(bot_id: UUID, db: Session = Depends(get_db)) -> dict:
-    bot, status = get_bot(db, bot_id)
+async def get_webhook_info(bot_id: UUID, db: AsyncSession = Depends(get_async_db)) -> dict:
+    bot, status = await aio_bot.get_bot_snapshot(db, bot_id)
     if status != 200:
         raise HTTPException(status_code=404, detail="Bot not found.")
 
-    telegram_api_url = f"https://api.telegram.org/bot{b64decode(bot.token).decode()}"
+    token = bot.api_token
 
     if DOMAIN:
         callback_url = f"{DOMAIN}/bot/{bot_id}/webhook"
-        get_info_url = f"{telegram_api_url}/getWebhookInfo"
-        info_response = requests.get(get_info_url)
-
-        if info_response.status_code == 200:
-            info_data = info_response.json()
-            if info_data.get("ok"):
-                webhook_url = info_data["result"].get("url")
-                return { "webhook_info": webhook_url == callback_url }
+        try:
+            info = await telegram_api.get_webhook_info(token)
+            return { "webhook_info": info.get("url") == callback_url }
+        except telegram_api.TelegramAPIError:
+            pass
 
     return { "webhook_info": False }
 
 @router.post("/{bot_id}/webhook")
-async def webhook(bot_id: UUID, update: dict, db: Session = Depends(get_db)):
-    bot, status = get_bot(db, bot_id)
-    telegram_api_url = f"https://api.telegram.org/bot{b64decode(bot.token).decode()}"
-
+async def webhook(bot_id: UUID, update: dict, db: AsyncSession = Depends(get_async_db)):
+    # jen ověřit bota (snapshot z cache), zařadit a hned odpovědět, pomalá odpověď vede k opakovanému doručení
+    started = time.perf_counter()
+    try:
+        bot, status = await aio_bot.get_bot_snapshot(db, bot_id)
+        if status != 200 or not bot.api_token:
+            raise HTTPException(status_code=404, detail="Bot nenalezen.")
+        if not enqueue_update(bot_id, update):
+            raise HTTPException(status_code=503, detail="Fronta webhooků je plná.")
+        return {"ok": True}
+    finally:
+        record_ack(time.perf_counter() - started)
+
+async def process_update(bot_id: UUID, update: dict):
+    async with AsyncSessionLocal() as db:
+        update_id = update.get("update_id")
+        # LRU ve frontě chytí jen opakování do stejného procesu, tohle i ostatní workery a restart
+        if update_id is not None and not await claim_update(db, bot_id, update_id):
+            logger.info(f"🔁 Update {update_id} bota {bot_id} už byl zpracován")
+            return
+        await handle_update(db, bot_id, update)
+        await db.commit()
+
+async def handle_update(db: AsyncSession, bot_id: UUID, update: dict):
     print("update", update)
 
     if "callback_query" in update:
         callback_data = update['callback_query']['data']
         user_id_str, user_res = callback_data.split('|')
         user_id = UUID(user_id_str)
-        user = get_user(db, user_id)
+        user = await aio_user.get_user(db, user_id)
 
         if user_res == "t" and user.next_message_id > 1:
-            update_users_level(db, user_id)
+            await aio_user.update_users_level(db, user_id)
         elif user_res in "12345":
-            update_rating(db, user_id, int(user_res))
-            send_message_to_user(db, user)
+            await aio_user.update_rating(db, user_id, int(user_res))
+            await aio_user.send_message_to_user(db, user)
 
     if "message" in update:
         message = update["message"]
@@ -248,19 +224,17 @@ async def webhook(bot_id: UUID, update: dict, db: Session = Depends(get_db)):
         chat_id = message["chat"]["id"]
         text = message.get("text", "").strip().lower()
 
-        user = get_current_user(db, chat_id, bot_id) 
+        user = await aio_user.get_current_user(db, chat_id, bot_id) 
 
         if text == "/start":
             if not user:
-                user = create_user(db, UserCreate(from_id=from_id, chat_id=chat_id, bot_id=bot_id, name=name, username=username))
-                assing_academy_link(db, bot_id, user.id)
-                send_message_to_user(db, user)
+                user = await aio_user.create_user(db, UserCreate(from_id=from_id, chat_id=chat_id, bot_id=bot_id, name=name, username=username))
+                await assign_academy_link(db, bot_id, user.id)
+                await aio_user.send_message_to_user(db, user)
         
         else:
-            update_reference(db, user.id, text)
-            send_message_to_user(db, user)
-
-    return {"ok": True}
+            await aio_user.update_reference(db, user.id, text)
+            await aio_user.send_message_to_user(db, user)
 
 @router.get("/statistics/{bot_id}", response_model=List[Statistic])
 def fetch_statistics(
@@ -274,7 +248,7 @@ def fetch_statistics(
     if not verify_token(db, bot_id, token):
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    db_bot, status = get_bot(db, bot_id)
+    db_bot, status = get_bot_snapshot(db, bot_id)
     if status == 404:
         raise HTTPException(status_code=404, detail="Tento bot neexistuje!")
 
@@ -282,35 +256,37 @@ def fetch_statistics(
     return get_statistics(db, bot_id, interval=interval, custom_range=custom_range)
 
 @router.post("/analytics/increase/{bot_name}")
-def fetch_increase_analytics(bot_name: str, db: Session = Depends(get_db)):
-    db_data, status = increase_analytic_data(db, bot_name)
-
-    if status == 404:
+async def fetch_increase_analytics(bot_name: str):
+    # návštěva jde do bufferu, do DB se zapisuje hromadně (utils.visit_buffer)
+    bot_id = await resolve_bot_id(bot_name)
+    if bot_id is None:
         raise HTTPException(status_code=404, detail="Tento bot neexistuje!")
 
+    record_visit(bot_id)
+
     return {"status": "ok", "message": "Úspěch"}
 
 @router.post("/send-academy-link/{user_id}")
-async def send_academy_links(user_id: UUID, db: Session = Depends(get_db)):
-    user = get_user(db, user_id)
+async def send_academy_links(user_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    user = await aio_user.get_user(db, user_id)
 
-    send_message_to_user(db, user)
+    await aio_user.send_message_to_user(db, user)
 
     return {"status": "ok", "message": "Zpracování spuštěno"}
 
 @router.get("/videos/{user_id}")
-async def get_videos(user_id: UUID, db: Session = Depends(get_db)):
-    user = get_user(db, user_id)
-    bot, status = get_bot(db, user.bot_id)
+async def get_videos(user_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    user = await aio_user.get_user(db, user_id)
+    bot, status = await aio_bot.get_bot_snapshot(db, user.bot_id)
 
     return {"videos": bot.videos, "footer_data": { "telegram": bot.support_contact, "instagram": bot.instagram }}
 
 @router.get("/references")
 async def fetch_references(
     all_references: bool = Query(False, alias="all_references"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    return {"references": get_references(db, all_references)}
+    return {"references": await aio_user.get_references(db, all_references)}
 
 @router.get("/users/{bot_id}")
 def fetch_public_users(
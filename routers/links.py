@@ -3,7 +3,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import get_db
 from schemas.links import ReadLink, UpdateLink
 from crud.links import create_link, get_link, get_all_links, update_link, delete_link
 from crud.bot import verify_token
@@ -16,13 +16,6 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/{bot_id}")
 def create_academy_link(bot_id: UUID, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     if not verify_token(db, bot_id, token):
@@ -3,7 +3,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import get_db
 from schemas.bot import ReadSequence, UpdateSequence
 from crud.sequence import create_sequence, get_sequence, get_all_sequences, update_sequence, delete_sequence
 from crud.bot import verify_token
@@ -16,13 +16,6 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/{bot_id}")
 def post_sequence(bot_id: UUID, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     if not verify_token(db, bot_id, token):
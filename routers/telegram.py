@@ -1,40 +1,18 @@
 import os
-import io
-import subprocess
-import tempfile
-import cv2
+import asyncio
+import uuid
+from uuid import UUID
 
 from dotenv import load_dotenv
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from telethon import TelegramClient
-from telethon.sessions import StringSession
-from telethon.errors import SessionPasswordNeededError
-from telethon.tl.functions.contacts import GetContactsRequest, AddContactRequest
-from telethon.tl.types import InputPeerUser, DocumentAttributeVideo
 
-from vokativ import sex, vokativ
-
-
-def get_user_name(n):
-    if sex(n) == "w":
-        return vokativ(n, woman=True)
-    return vokativ(n, woman=False)
-
-def get_video_metadata(path: str):
-    try:
-        cap = cv2.VideoCapture(path)
-        if not cap.isOpened():
-            return None
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = cap.get(cv2.CAP_PROP_FPS) or 25
-        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-        duration = int(frame_count / fps)
-        cap.release()
-        return width, height, duration
-    except Exception:
-        return None
+from database import AsyncSessionLocal
+from crud.aio.broadcast import create_job, get_job_progress, FINAL_STATUSES
+from schemas.broadcast import BroadcastJobCreated, BroadcastProgress
+from utils.broadcast_jobs import spool_path, remove_spooled, notify_new_job, BROADCAST_MAX_UPLOAD_MB
+from utils.upload_spool import spool_multipart, UploadError
 
 load_dotenv()
 
@@ -42,6 +20,7 @@ router = APIRouter()
 
 API_ID = int(os.getenv("TG_API_ID"))
 API_HASH = os.getenv(("TG_API_HASH"))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "1"))
 
 # Pydantic modely pro vstup
 class StartLoginRequest(BaseModel):
@@ -60,6 +39,10 @@ class TelegramBroadcastSchema(BaseModel):
 
 @router.post("/start")
 async def start_login(data: StartLoginRequest):
+    # telethon se importuje až tady, ať nezdržuje start API
+    from telethon import TelegramClient
+    from telethon.sessions import StringSession
+
     client = TelegramClient(StringSession(), API_ID, API_HASH)
     await client.connect()
 
@@ -80,6 +63,10 @@ async def start_login(data: StartLoginRequest):
 
 @router.post("/confirm")
 async def confirm_code(data: ConfirmCodeRequest):
+    from telethon import TelegramClient
+    from telethon.sessions import StringSession
+    from telethon.errors import SessionPasswordNeededError
+
     client = TelegramClient(StringSession(data.session), API_ID, API_HASH)
     try:
         await client.connect()
@@ -102,218 +89,84 @@ async def confirm_code(data: ConfirmCodeRequest):
         "session": session_string
     }
 
-@router.post("/broadcast")
-async def broadcast_message(
-    session: str = Form(...),
-    message: str = Form(...),
-    lang: str = Form(...),
-    file: UploadFile = File(None)
-):
-    try:
-        async with TelegramClient(StringSession(session), API_ID, API_HASH) as client:
-            me = await client.get_me()
-            dialogs = await client.get_dialogs()
-
-            for dialog in dialogs:
-                if dialog.is_user and dialog.entity.id != me.id:
-                    user = dialog.entity
-                    try:
-                        await client(AddContactRequest(
-                            id=user.id,
-                            first_name=user.first_name or "NoName",
-                            last_name=user.last_name or "",
-                            phone="",
-                            add_phone_privacy_exception=False
-                        ))
-                    except Exception:
-                        pass
-
-            contacts = await client(GetContactsRequest(hash=0))
-            sent = 0
-            failed = []
-
-            temp_video_path = None
-            if file and file.content_type and file.content_type.startswith("video/"):
-                import tempfile, shutil
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_input:
-                    shutil.copyfileobj(file.file, temp_input)
-                    temp_video_path = temp_input.name
-
-            for user in contacts.users:
-                if user.bot or not user.access_hash or user.id == me.id:
-                    continue
-
-                try:
-                    name = get_user_name(user.first_name) if lang in ("cs", "sk") else user.first_name or "friend"
-                    peer = InputPeerUser(user.id, user.access_hash)
-                    personalized_msg = message.replace("{name}", name)
-
-                    if file:
-                        mime = file.content_type or ""
-
-                        if mime.startswith("image/"):
-                            file.file.seek(0)
-                            await client.send_file(
-                                peer,
-                                file.file,
-                                caption=None,
-                                supports_streaming=True,
-                                force_document=False
-                            )
-                            await client.send_message(peer, personalized_msg, parse_mode="html")
-
-                        elif mime.startswith("video/") and temp_video_path:
-                            metadata = get_video_metadata(temp_video_path)
-                            if metadata:
-                                w, h, duration = metadata
-                            else:
-                                w, h, duration = 720, 1280, 10  # fallback
-                            
-                            await client.send_file(
-                                peer,
-                                temp_video_path,
-                                caption=None,
-                                attributes=[
-                                    DocumentAttributeVideo(duration=duration, w=w, h=h, supports_streaming=True)
-                                ],
-                                force_document=False
-                            )
-                            await client.send_message(peer, personalized_msg, parse_mode="html")
-
-                        else:
-                            file.file.seek(0)
-                            await client.send_file(
-                                peer,
-                                file.file,
-                                caption=None,
-                                file_name=file.filename,
-                                force_document=True
-                            )
-                            await client.send_message(peer, personalized_msg, parse_mode="html")
-                    else:
-                        await client.send_message(peer, personalized_msg, parse_mode="html")
-
-                    sent += 1
-                except Exception as e:
-                    failed.append({
-                        "id": user.id,
-                        "username": user.username,
-                        "error": str(e)
-                    })
-
-            return {
-                "success": True,
-                "sent": sent,
-                "failed": failed,
-                "total": len(contacts.users),
-            }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Chyba při broadcastu: {e}")
+# formulář se čte ručně po kouscích (utils/upload_spool), dokumentace ho proto popisuje tady
+BROADCAST_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["session", "message", "lang"],
+            "properties": {
+                "session": {"type": "string"},
+                "message": {"type": "string"},
+                "lang": {"type": "string"},
+                "file": {"type": "string", "format": "binary"},
+            },
+        }}},
+    }
+}
 
-@router.post("/broadcast-new")
-async def broadcast_new_contacts(
-    session: str = Form(...),
-    message: str = Form(...),
-    lang: str = Form(...),
-    file: UploadFile = File(None)
-):
+async def enqueue_broadcast(mode: str, request: Request):
+    job_id = uuid.uuid4()
+    # příloha jde z requestu rovnou do spool adresáře, worker ji pak čte z disku
     try:
-        async with TelegramClient(StringSession(session), API_ID, API_HASH) as client:
-            me = await client.get_me()
-
-            # Kontakty před přidáním
-            old_contacts = await client(GetContactsRequest(hash=0))
-            old_ids = {user.id for user in old_contacts.users}
-
-            # Přidání nových lidí z dialogu
-            dialogs = await client.get_dialogs()
-            for dialog in dialogs:
-                if dialog.is_user and dialog.entity.id != me.id:
-                    user = dialog.entity
-                    if user.id not in old_ids:
-                        try:
-                            await client(AddContactRequest(
-                                id=user.id,
-                                first_name=user.first_name or "NoName",
-                                last_name=user.last_name or "",
-                                phone="",
-                                add_phone_privacy_exception=False
-                            ))
-                        except Exception:
-                            pass
-
-            # Kontakty po přidání
-            updated_contacts = await client(GetContactsRequest(hash=0))
-            new_users = [
-                u for u in updated_contacts.users
-                if u.id not in old_ids and not u.bot and u.access_hash and u.id != me.id
-            ]
-
-            # Video příprava
-            temp_video_path = None
-            if file and file.content_type and file.content_type.startswith("video/"):
-                import shutil
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_input:
-                    shutil.copyfileobj(file.file, temp_input)
-                    temp_video_path = temp_input.name
-
-            sent = 0
-            failed = []
-
-            for user in new_users:
-                try:
-                    name = get_user_name(user.first_name) if lang in ("cs", "sk") else user.first_name or "friend"
-                    peer = InputPeerUser(user.id, user.access_hash)
-                    personalized_msg = message.replace("{name}", name)
-
-                    if file:
-                        mime = file.content_type or ""
-
-                        if mime.startswith("video/") and temp_video_path:
-                            metadata = get_video_metadata(temp_video_path)
-                            if metadata:
-                                w, h, duration = metadata
-                            else:
-                                w, h, duration = 720, 1280, 10
-                            
-                            await client.send_file(
-                                peer,
-                                temp_video_path,
-                                caption=None,
-                                attributes=[
-                                    DocumentAttributeVideo(duration=duration, w=w, h=h, supports_streaming=True)
-                                ],
-                                force_document=False
-                            )
-                            await client.send_message(peer, personalized_msg, parse_mode="html")
-                        else:
-                            file.file.seek(0)
-                            await client.send_file(
-                                peer,
-                                file.file,
-                                caption=None,
-                                file_name=file.filename,
-                                force_document=True
-                            )
-                            await client.send_message(peer, personalized_msg, parse_mode="html")
-                    else:
-                        await client.send_message(peer, personalized_msg, parse_mode="html")
-
-                    sent += 1
-                except Exception as e:
-                    failed.append({
-                        "id": user.id,
-                        "username": user.username,
-                        "error": str(e)
-                    })
-
-            return {
-                "success": True,
-                "sent": sent,
-                "failed": failed,
-                "new_contacts": len(new_users),
-            }
+        fields, upload = await spool_multipart(
+            request, lambda file_name: spool_path(job_id, file_name), BROADCAST_MAX_UPLOAD_MB * 1024 * 1024
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    file_path = upload.path if upload else None
+    missing = [name for name in ("session", "message", "lang") if not fields.get(name)]
+    if missing:
+        remove_spooled(file_path)
+        raise HTTPException(status_code=422, detail=f"Chybí pole: {', '.join(missing)}")
 
+    try:
+        async with AsyncSessionLocal() as db:
+            await create_job(
+                db, job_id, mode, fields["session"], fields["message"], fields["lang"],
+                file_path=file_path,
+                file_name=upload.file_name if upload else None,
+                file_mime=upload.content_type if upload else None,
+                file_sha256=upload.sha256 if upload else None,
+            )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Chyba při broadcastu: {e}")
+        remove_spooled(file_path)
+        raise HTTPException(status_code=500, detail=f"Chyba při zakládání broadcastu: {e}")
+
+    notify_new_job()
+    return BroadcastJobCreated(job_id=job_id, status="queued")
+
+# broadcast běží na pozadí (utils/broadcast_jobs), průběh vrací GET /broadcast/{job_id}
+@router.post("/broadcast", response_model=BroadcastJobCreated, openapi_extra=BROADCAST_FORM)
+async def broadcast_message(request: Request):
+    return await enqueue_broadcast("all", request)
+
+@router.post("/broadcast-new", response_model=BroadcastJobCreated, openapi_extra=BROADCAST_FORM)
+async def broadcast_new_contacts(request: Request):
+    return await enqueue_broadcast("new", request)
+
+async def load_progress(job_id: UUID):
+    async with AsyncSessionLocal() as db:
+        progress = await get_job_progress(db, job_id)
+    return BroadcastProgress(**progress) if progress else None
+
+@router.get("/broadcast/{job_id}", response_model=BroadcastProgress)
+async def broadcast_progress(job_id: UUID, follow: bool = Query(False)):
+    progress = await load_progress(job_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Broadcast nenalezen")
+    if not follow:
+        return progress
+
+    # server-sent events: stav každou sekundu, dokud broadcast neskončí
+    async def stream(progress):
+        while True:
+            yield f"data: {progress.model_dump_json()}\n\n"
+            if progress.status in FINAL_STATUSES:
+                return
+            await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+            progress = await load_progress(job_id) or progress
+
+    return StreamingResponse(stream(progress), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
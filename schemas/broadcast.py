@@ -0,0 +1,32 @@
+# schemas/broadcast.py
+
+from pydantic import BaseModel
+from typing import Optional, List
+from uuid import UUID
+from datetime import datetime
+
+class BroadcastFailure(BaseModel):
+    id: int
+    username: Optional[str] = None
+    error: Optional[str] = None
+
+class BroadcastJobCreated(BaseModel):
+    success: bool = True
+    job_id: UUID
+    status: str
+
+class BroadcastProgress(BaseModel):
+    job_id: UUID
+    mode: str
+    status: str
+    total: Optional[int] = None
+    sent: int
+    failed: int
+    remaining: Optional[int] = None
+    rate: float
+    eta_seconds: Optional[int] = None
+    error: Optional[str] = None
+    failed_recipients: List[BroadcastFailure] = []
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -1,9 +1,25 @@
+import os
+import hmac
+from typing import Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+admin_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+# bez nastaveného tokenu je admin API zavřené
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+def verify_admin(token: Optional[str] = Depends(admin_scheme)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin API není nastavené (ADMIN_TOKEN)")
+    if not token or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Neplatný admin token", headers={"WWW-Authenticate": "Bearer"})
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def postgres():
+    """Testy nad skutečným PostgreSQL (DATABASE_URL); bez databáze se přeskočí."""
+    from sqlalchemy import text
+    try:
+        from database import SessionLocal
+    except Exception as e:
+        pytest.skip(f"Databázová vrstva nejde načíst: {e}")
+    if not os.getenv("DATABASE_URL"):
+        pytest.skip("DATABASE_URL není nastavená")
+
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+    except Exception as e:
+        db.close()
+        pytest.skip(f"PostgreSQL není dostupný: {e}")
+    yield db
+    db.close()
@@ -0,0 +1,64 @@
+import asyncio
+import types
+
+import pytest
+
+pytest.importorskip("telethon")
+from telethon.errors import FileReferenceExpiredError
+from telethon.tl.types import Document, InputFile
+
+from utils.broadcast_media import prepare_broadcast_media
+
+class FakeClient:
+    """Zaznamenává uploady a co se posílalo; odeslaná zpráva nese dokument jako od Telegramu."""
+
+    def __init__(self, expire_after=None):
+        self.uploads = 0
+        self.sent = []
+        self.expire_after = expire_after
+
+    async def upload_file(self, file, file_name=None):
+        self.uploads += 1
+        await asyncio.sleep(0.01)
+        return InputFile(id=self.uploads, parts=1, name=file_name, md5_checksum="")
+
+    async def send_file(self, peer, file, **kwargs):
+        await asyncio.sleep(0.001)
+        if isinstance(file, Document) and self.expire_after is not None and len(self.sent) >= self.expire_after:
+            self.expire_after = None
+            raise FileReferenceExpiredError(request=None)
+        self.sent.append((peer, type(file).__name__))
+        document = Document(id=len(self.sent), access_hash=1, file_reference=b"ref", date=None,
+                            mime_type="application/pdf", size=1, dc_id=2, attributes=[])
+        return types.SimpleNamespace(photo=None, document=document)
+
+@pytest.fixture
+def attachment(tmp_path):
+    path = tmp_path / "letak.pdf"
+    path.write_bytes(b"%PDF" + b"\0" * 4096)
+    return str(path)
+
+def broadcast(client, attachment, recipients):
+    async def run():
+        media = await prepare_broadcast_media(client, attachment, "letak.pdf", "application/pdf")
+        await asyncio.gather(*(media.send(peer) for peer in range(recipients)))
+        return media
+    return asyncio.run(run())
+
+def test_attachment_uploaded_once_for_all_recipients(attachment):
+    client = FakeClient()
+    broadcast(client, attachment, 200)
+
+    assert client.uploads == 1
+    assert len(client.sent) == 200
+    # první příjemce dostane nahraný soubor, ostatní už dokument z jeho zprávy
+    assert [kind for _, kind in client.sent].count("InputFile") == 1
+    assert {kind for _, kind in client.sent[1:]} == {"Document"}
+
+def test_expired_file_reference_resends_without_new_upload(attachment):
+    client = FakeClient(expire_after=50)
+    broadcast(client, attachment, 100)
+
+    assert client.uploads == 1
+    assert len(client.sent) == 100
+    assert [kind for _, kind in client.sent].count("InputFile") == 2
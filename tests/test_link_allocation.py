@@ -0,0 +1,73 @@
+import asyncio
+import uuid
+from collections import Counter
+
+import pytest
+
+SHARES = {"a": 5, "b": 3, "c": 2}
+
+@pytest.fixture
+def bot_links(postgres):
+    from models.bot import BotList
+    from crud.links import create_link, update_link
+    from schemas.links import UpdateLink
+
+    bot_id = uuid.uuid4()
+    for _ in SHARES:
+        create_link(postgres, bot_id)
+    links = postgres.query(BotList).filter(BotList.bot_id == bot_id).order_by(BotList.position).all()
+    for link, (child, share) in zip(links, SHARES.items()):
+        update_link(postgres, link.id, UpdateLink(share=share, child=child))
+    yield bot_id
+    postgres.query(BotList).filter(BotList.bot_id == bot_id).delete()
+    postgres.commit()
+
+def allocate_many(bot_id, count: int, concurrency: int):
+    from database import AsyncSessionLocal, async_engine
+    from crud.aio.links import allocate_link
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore, AsyncSessionLocal() as db:
+                child = await allocate_link(db, bot_id)
+                await db.commit()
+                return child
+
+        try:
+            return await asyncio.gather(*(one() for _ in range(count)))
+        finally:
+            # pool je svázaný s event loopem tohoto asyncio.run
+            await async_engine.dispose()
+
+    return asyncio.run(run())
+
+def test_parallel_allocation_matches_shares(bot_links):
+    cycles = 60
+    children = allocate_many(bot_links, cycles * sum(SHARES.values()), concurrency=32)
+    assert Counter(children) == {child: share * cycles for child, share in SHARES.items()}
+
+def test_sql_matches_reference_arithmetic(postgres, bot_links):
+    from models.bot import BotList
+    from utils.link_weights import pick_link
+
+    # zlomkové podíly (API je nedovolí, v DB ale můžou být) – SQL i pick_link musí vybírat stejně
+    links = postgres.query(BotList).filter(BotList.bot_id == bot_links).all()
+    shares = {link.id: share for link, share in zip(links, (0.15, 0.3333, 1.2))}
+    for link in links:
+        link.share = shares[link.id]
+    postgres.commit()
+
+    child_by_id = {link.id: link.child for link in links}
+    current = {}
+    expected = [child_by_id[pick_link(current, shares)] for _ in range(200)]
+    assert allocate_many(bot_links, 200, concurrency=1) == expected
+
+def test_allocation_is_smooth_within_cycle(bot_links):
+    children = allocate_many(bot_links, 3 * sum(SHARES.values()), concurrency=1)
+    cycle = sum(SHARES.values())
+    for start in range(0, len(children), cycle):
+        assert Counter(children[start:start + cycle]) == SHARES
+    # smooth WRR neposílá celý podíl odkazu za sebou
+    assert children[:cycle] != sorted(children[:cycle], key=list(SHARES).index)
@@ -0,0 +1,40 @@
+from collections import Counter
+from itertools import groupby
+
+from utils.link_weights import LINK_SHARE_SCALE, pick_link, scaled_share
+
+def run(shares, count):
+    current = {}
+    return [pick_link(current, shares) for _ in range(count)], current
+
+def test_fractional_shares_do_not_drift():
+    shares = {"a": 0.1, "b": 0.2, "c": 0.7}
+    cycle = sum(scaled_share(share) for share in shares.values())
+    picks, current = run(shares, cycle * 50)
+    # celočíselné váhy: po každém celém cyklu se vše vrátí přesně na nulu a poměry sedí na kus
+    assert current == {"a": 0, "b": 0, "c": 0}
+    assert Counter(picks) == {"a": 5000, "b": 10000, "c": 35000}
+
+def test_weights_sum_to_zero_after_every_step():
+    current = {}
+    for _ in range(1000):
+        pick_link(current, {"a": 1.5, "b": 2.25, "c": 0.3})
+        assert sum(current.values()) == 0
+
+def test_allocation_is_smooth():
+    picks, _ = run({"a": 5, "b": 3, "c": 2}, 10)
+    assert Counter(picks) == {"a": 5, "b": 3, "c": 2}
+    # smooth WRR střídá odkazy, nejdelší běh stejného odkazu je 2
+    assert max(len(list(group)) for _, group in groupby(picks)) <= 2
+
+def test_zero_and_missing_shares_are_skipped():
+    picks, _ = run({"a": 0, "b": None, "c": 1}, 3)
+    assert picks == ["c", "c", "c"]
+    assert run({"a": 0}, 1)[0] == [None]
+
+def test_ties_pick_lowest_key():
+    assert run({"b": 1, "a": 1}, 2)[0] == ["a", "b"]
+
+def test_scaled_share_rounds_half_up():
+    assert scaled_share(0.0005) == 1
+    assert scaled_share(2) == 2 * LINK_SHARE_SCALE
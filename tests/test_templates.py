@@ -0,0 +1,57 @@
+import glob
+import json
+import os
+
+import pytest
+
+from utils.templates import compile_template, render, render_template
+
+TRACES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "traces")
+
+CONTEXT = {
+    "name": "Petře",
+    "botName": "Kachna",
+    "supportContact": "@podpora",
+    "network": "https://discord.gg/U5NtgQjg53",
+    "eventName": "Meetup",
+    "eventDate": "01. 11. 2026, 18:00",
+    "eventLocation": "Praha",
+    "academyLink": "https://example.com/a",
+    "videoLink": "https://example.com/v",
+    "userId": "42",
+}
+
+def trace_messages():
+    messages = []
+    for path in sorted(glob.glob(os.path.join(TRACES, "*", "*", "level-*.json"))):
+        with open(path, encoding="utf-8") as file:
+            messages += [message["content"] for message in json.load(file).get("messages", []) if message.get("content")]
+    return messages
+
+def legacy_render(message: str, context: dict) -> str:
+    # původní replace_variables: str.replace pro každou proměnnou a nakonec <br>
+    for key, value in context.items():
+        message = message.replace(f"{{{key}}}", value)
+    return message.replace("<br>", "\n")
+
+def test_segments():
+    assert compile_template("Ahoj {name},<br>tady {botName}!") == ((("Ahoj ", "name"), (",\ntady ", "botName")), "!")
+    assert compile_template("bez proměnných") == ((), "bez proměnných")
+
+def test_compile_is_cached():
+    message = "Cache {name} {userId}"
+    compile_template.cache_clear()
+    first = compile_template(message)
+    assert compile_template(message) is first
+    info = compile_template.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+def test_unknown_placeholder_is_kept():
+    assert render_template("{name} a {url}", {"name": "Jano"}) == "Jano a {url}"
+
+def test_matches_legacy_replace_on_all_traces():
+    messages = trace_messages()
+    if not messages:
+        pytest.skip("data/traces nejsou k dispozici")
+    for message in messages:
+        assert render(compile_template(message), CONTEXT) == legacy_render(message, CONTEXT)
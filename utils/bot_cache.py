@@ -0,0 +1,135 @@
+import os
+import time
+import select
+import threading
+import logging
+from base64 import b64decode
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+BOT_CACHE_TTL = float(os.getenv("BOT_CACHE_TTL", "60"))
+# LISTEN/NOTIFY pro invalidaci napříč procesy (více uvicorn workerů, scheduler)
+BOT_CACHE_NOTIFY = os.getenv("BOT_CACHE_NOTIFY", "0") == "1"
+BOT_CACHE_CHANNEL = "bot_cache"
+
+class BotSnapshot(NamedTuple):
+    """Neměnná kopie řádku bots pro hot path (posílání, rendering, ověření tokenu)."""
+    id: UUID
+    name: Optional[str]
+    token: Optional[str]
+    api_token: Optional[str]
+    lang: Optional[str]
+    is_event: Optional[bool]
+    support_contact: Optional[str]
+    instagram: Optional[str]
+    event_name: Optional[str]
+    event_date: Optional[datetime]
+    event_location: Optional[str]
+    videos: Optional[Tuple[str, ...]]
+
+_cache = {}
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_listener_thread = None
+_stop_event = threading.Event()
+
+def snapshot_bot(db_bot) -> BotSnapshot:
+    return BotSnapshot(
+        id=db_bot.id,
+        name=db_bot.name,
+        token=db_bot.token,
+        api_token=b64decode(db_bot.token).decode() if db_bot.token else None,
+        lang=db_bot.lang,
+        is_event=db_bot.is_event,
+        support_contact=db_bot.support_contact,
+        instagram=db_bot.instagram,
+        event_name=db_bot.event_name,
+        event_date=db_bot.event_date,
+        event_location=db_bot.event_location,
+        videos=tuple(db_bot.videos) if db_bot.videos is not None else None,
+    )
+
+def get_cached_bot(bot_id: UUID) -> Optional[BotSnapshot]:
+    entry = _cache.get(bot_id)
+    if entry is None or entry[0] < time.monotonic():
+        _stats["misses"] += 1
+        return None
+    _stats["hits"] += 1
+    return entry[1]
+
+def cache_bot(db_bot) -> BotSnapshot:
+    snapshot = snapshot_bot(db_bot)
+    with _lock:
+        _cache[snapshot.id] = (time.monotonic() + BOT_CACHE_TTL, snapshot)
+    return snapshot
+
+def forget_bot(bot_id: UUID):
+    with _lock:
+        _cache.pop(bot_id, None)
+    _stats["invalidations"] += 1
+
+def invalidate_bot(db: Session, bot_id: UUID):
+    """Volat po commitu změny bota: zahodí lokální kopii a dá vědět ostatním procesům."""
+    forget_bot(bot_id)
+    if BOT_CACHE_NOTIFY:
+        db.execute(text("SELECT pg_notify(:channel, :bot_id)"), {"channel": BOT_CACHE_CHANNEL, "bot_id": str(bot_id)})
+        db.commit()
+
+def clear_bot_cache():
+    with _lock:
+        _cache.clear()
+
+def get_bot_cache_stats():
+    return {**_stats, "size": len(_cache), "ttl": BOT_CACHE_TTL, "notify": BOT_CACHE_NOTIFY}
+
+register_collector("bot_cache", get_bot_cache_stats)
+
+def _listen():
+    import psycopg2
+    from sqlalchemy.engine import make_url
+    from database import DATABASE_URL
+
+    dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+
+    while not _stop_event.is_set():
+        try:
+            conn = psycopg2.connect(dsn)
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {BOT_CACHE_CHANNEL}")
+            # během výpadku spojení mohly notifikace propadnout
+            clear_bot_cache()
+            while not _stop_event.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        forget_bot(UUID(notify.payload))
+                    except ValueError:
+                        clear_bot_cache()
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ LISTEN {BOT_CACHE_CHANNEL} selhal: {e}, zkusím to znovu")
+            _stop_event.wait(5)
+
+def start_bot_cache_listener():
+    global _listener_thread
+    if not BOT_CACHE_NOTIFY or (_listener_thread and _listener_thread.is_alive()):
+        return
+
+    _stop_event.clear()
+    _listener_thread = threading.Thread(target=_listen, name="bot-cache-listener", daemon=True)
+    _listener_thread.start()
+    logger.info(f"👂 Poslouchám invalidace cache botů na kanálu {BOT_CACHE_CHANNEL}")
+
+def stop_bot_cache_listener():
+    _stop_event.set()
@@ -0,0 +1,272 @@
+import os
+import time
+import asyncio
+import logging
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Optional
+from uuid import UUID
+
+from database import AsyncSessionLocal
+from crud.aio.broadcast import (
+    claim_job, renew_lease, release_job, save_recipients, next_recipients,
+    mark_recipient_sending, mark_recipient_pending, mark_recipient_done, finish_job, get_active_file_paths,
+)
+from utils.broadcast_pacer import AccountPacer, get_pacer
+from utils.names import get_vocative_name
+from utils.metrics import register_collector
+
+# telethon (a moduly, které ho potřebují) se načítá až s prvním jobem, ne při startu API
+if TYPE_CHECKING:
+    from telethon import TelegramClient
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_MAX_JOBS = int(os.getenv("BROADCAST_MAX_JOBS", "2"))
+BROADCAST_POLL_INTERVAL = float(os.getenv("BROADCAST_POLL_INTERVAL", "5"))
+BROADCAST_LEASE_SECONDS = int(os.getenv("BROADCAST_LEASE_SECONDS", "120"))
+BROADCAST_MAX_ATTEMPTS = int(os.getenv("BROADCAST_MAX_ATTEMPTS", "3"))
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", "50"))
+# souběžné requesty jednoho účtu; tempo samotné hlídá AccountPacer
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "3"))
+BROADCAST_MAX_FLOOD_RETRIES = int(os.getenv("BROADCAST_MAX_FLOOD_RETRIES", "5"))
+# přílohy musí přežít restart, aby šlo job dokončit
+BROADCAST_SPOOL_DIR = os.getenv("BROADCAST_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "duckbot-broadcasts"))
+BROADCAST_MAX_UPLOAD_MB = int(os.getenv("BROADCAST_MAX_UPLOAD_MB", "2000"))
+# soubory bez aktivního jobu (pád mezi uploadem a založením jobu) se mažou po této době
+BROADCAST_SPOOL_ORPHAN_AGE = int(os.getenv("BROADCAST_SPOOL_ORPHAN_AGE", "3600"))
+
+_jobs = {}
+_task = None
+_wakeup: Optional[asyncio.Event] = None
+_stats = {"jobs_done": 0, "jobs_failed": 0, "jobs_retried": 0, "sent": 0, "failed": 0, "requeued": 0}
+
+def spool_path(job_id: UUID, file_name: Optional[str]) -> str:
+    os.makedirs(BROADCAST_SPOOL_DIR, exist_ok=True)
+    return os.path.join(BROADCAST_SPOOL_DIR, f"{job_id}{os.path.splitext(file_name or '')[1]}")
+
+def remove_spooled(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+async def sweep_spool_dir() -> int:
+    """Smaže přílohy, ke kterým už nepatří žádný čekající ani běžící job."""
+    try:
+        entries = [entry for entry in os.scandir(BROADCAST_SPOOL_DIR) if entry.is_file()]
+    except FileNotFoundError:
+        return 0
+    cutoff = time.time() - BROADCAST_SPOOL_ORPHAN_AGE
+    candidates = [entry.path for entry in entries if entry.stat().st_mtime < cutoff]
+    if not candidates:
+        return 0
+
+    async with AsyncSessionLocal() as db:
+        active = await get_active_file_paths(db, candidates)
+    orphans = [path for path in candidates if path not in active]
+    for path in orphans:
+        remove_spooled(path)
+    if orphans:
+        logger.info(f"🧹 Smazáno {len(orphans)} osiřelých příloh broadcastů")
+    return len(orphans)
+
+def notify_new_job():
+    if _wakeup is not None:
+        _wakeup.set()
+
+def _client(session: str) -> "TelegramClient":
+    from telethon import TelegramClient
+    from telethon.sessions import StringSession
+
+    return TelegramClient(StringSession(session), int(os.getenv("TG_API_ID")), os.getenv("TG_API_HASH"))
+
+async def send_to_recipient(client: "TelegramClient", pacer: AccountPacer, media, recipient, message: str, lang: str, media_sent: set):
+    from telethon.tl.types import InputPeerUser
+
+    name = get_vocative_name(recipient.first_name) if lang in ("cs", "sk") else recipient.first_name or "friend"
+    peer = InputPeerUser(recipient.user_id, recipient.access_hash)
+    # po FloodWait na textu se příloha podruhé neposílá
+    if media and recipient.user_id not in media_sent:
+        await pacer.wait()
+        await media.send(peer)
+        media_sent.add(recipient.user_id)
+    await pacer.wait()
+    await client.send_message(peer, message.replace("{name}", name), parse_mode="html")
+
+async def send_recipients(client: "TelegramClient", job):
+    from telethon.errors import FloodWaitError, PeerFloodError
+    from utils.broadcast_media import prepare_broadcast_media
+
+    # FloodWait řeší pacer pro celý účet, Telethon by jinak uspal jen jeden request
+    client.flood_sleep_threshold = 0
+    media = await prepare_broadcast_media(
+        client, job.file_path, job.file_name, job.file_mime, allow_photo=job.mode == "all", content_hash=job.file_sha256
+    )
+    pacer = get_pacer(job.session)
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    media_sent = set()
+    flood_retries = Counter()
+    restricted = []
+
+    async def send(recipient):
+        async with semaphore:
+            await pacer.wait_resumed()
+            if restricted:
+                return
+            async with AsyncSessionLocal() as db:
+                # checkpoint před odesláním: po pádu se "sending" už znovu neposílá
+                if not await mark_recipient_sending(db, job.id, recipient.user_id):
+                    return
+                error = None
+                try:
+                    await send_to_recipient(client, pacer, media, recipient, job.message, job.lang, media_sent)
+                    pacer.success()
+                except FloodWaitError as e:
+                    pacer.flood(e.seconds)
+                    flood_retries[recipient.user_id] += 1
+                    if flood_retries[recipient.user_id] <= BROADCAST_MAX_FLOOD_RETRIES:
+                        # zpět do fronty, další dávka ho vezme znovu
+                        await mark_recipient_pending(db, job.id, recipient.user_id)
+                        _stats["requeued"] += 1
+                        return
+                    error = str(e)
+                except PeerFloodError as e:
+                    # účet má omezení na spam, další odesílání by jen sbíralo chyby
+                    restricted.append(e)
+                    await mark_recipient_pending(db, job.id, recipient.user_id)
+                    return
+                except Exception as e:
+                    error = str(e)
+
+                await mark_recipient_done(db, job.id, recipient.user_id, error)
+                _stats["failed" if error else "sent"] += 1
+
+    while True:
+        async with AsyncSessionLocal() as db:
+            recipients = await next_recipients(db, job.id, BROADCAST_BATCH_SIZE)
+        if not recipients:
+            return
+        await asyncio.gather(*(send(recipient) for recipient in recipients))
+        if restricted:
+            raise restricted[0]
+
+async def _keep_lease(job_id: UUID):
+    # lease se obnovuje i během dlouhé pauzy po FloodWait
+    while True:
+        await asyncio.sleep(BROADCAST_LEASE_SECONDS / 3)
+        try:
+            async with AsyncSessionLocal() as db:
+                await renew_lease(db, job_id, BROADCAST_LEASE_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Obnovení leasu broadcastu {job_id} selhalo: {e}")
+
+async def _finish(job, status: str, error: Optional[str] = None):
+    async with AsyncSessionLocal() as db:
+        await finish_job(db, job.id, status, error)
+    remove_spooled(job.file_path)
+    _stats["jobs_done" if status == "done" else "jobs_failed"] += 1
+
+async def _process_job(job) -> Optional[str]:
+    """Sync kontaktů, import a odeslání; vrací důvod, proč job nejde dokončit, jinak None."""
+    if job.file_path and not os.path.exists(job.file_path):
+        return "Příloha broadcastu už není na disku"
+
+    client = _client(job.session)
+    await client.connect()
+    try:
+        if not await client.is_user_authorized():
+            return "Session není přihlášená"
+
+        if job.total is None:
+            from utils.contact_sync import sync_contacts
+
+            recipients, import_new = await sync_contacts(client, job.session, get_pacer(job.session), job.mode)
+            async with AsyncSessionLocal() as db:
+                await save_recipients(db, job.id, recipients)
+            client.flood_sleep_threshold = 0
+            await import_new()
+
+        await send_recipients(client, job)
+    finally:
+        await client.disconnect()
+
+async def run_job(job):
+    logger.info(f"📣 Spouštím broadcast {job.id} (pokus {job.attempts})")
+    try:
+        # lease se obnovuje od zabrání jobu: sync a import kontaktů můžou trvat déle než samotný lease
+        keeper = asyncio.get_running_loop().create_task(_keep_lease(job.id))
+        try:
+            error = await _process_job(job)
+        finally:
+            keeper.cancel()
+
+        if error:
+            await _finish(job, "failed", error)
+            return
+        await _finish(job, "done")
+        logger.info(f"✅ Broadcast {job.id} dokončen")
+    except asyncio.CancelledError:
+        # vypínání: lease uvolnit, ať job hned převezme další běh
+        async with AsyncSessionLocal() as db:
+            await release_job(db, job.id)
+        raise
+    except Exception as e:
+        logger.error(f"❌ Broadcast {job.id} selhal: {e}")
+        if job.attempts >= BROADCAST_MAX_ATTEMPTS:
+            await _finish(job, "failed", str(e))
+        else:
+            _stats["jobs_retried"] += 1
+            async with AsyncSessionLocal() as db:
+                await release_job(db, job.id, datetime.now(timezone.utc) + timedelta(seconds=30 * job.attempts), str(e))
+
+async def _claim_jobs():
+    while len(_jobs) < BROADCAST_MAX_JOBS:
+        async with AsyncSessionLocal() as db:
+            job = await claim_job(db, BROADCAST_LEASE_SECONDS, exclude=list(_jobs))
+        if job is None:
+            return
+        task = asyncio.get_running_loop().create_task(run_job(job), name=f"broadcast-{job.id}")
+        _jobs[job.id] = task
+        task.add_done_callback(lambda _, job_id=job.id: _jobs.pop(job_id, None))
+
+async def _run():
+    swept_at = 0.0
+    while True:
+        _wakeup.clear()
+        try:
+            if time.monotonic() - swept_at > BROADCAST_SPOOL_ORPHAN_AGE:
+                swept_at = time.monotonic()
+                await sweep_spool_dir()
+            await _claim_jobs()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Chyba při zabírání broadcastů: {e}")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), BROADCAST_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+def start_broadcast_worker():
+    global _task, _wakeup
+    if _task is None or _task.done():
+        _wakeup = asyncio.Event()
+        _task = asyncio.get_running_loop().create_task(_run())
+
+async def stop_broadcast_worker():
+    global _task
+    tasks = [task for task in (_task, *_jobs.values()) if task is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _task = None
+
+def get_broadcast_stats():
+    return {**_stats, "running": len(_jobs)}
+
+register_collector("broadcasts", get_broadcast_stats)
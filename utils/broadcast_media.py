@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Optional
+
+from telethon.errors import FileReferenceExpiredError
+from telethon.tl.types import DocumentAttributeVideo
+
+from utils.video_probe import get_video_metadata
+
+logger = logging.getLogger(__name__)
+
+# (šířka, výška, délka) když se metadata videa nepodaří přečíst
+VIDEO_FALLBACK = (720, 1280, 10)
+
+class BroadcastMedia:
+    """Příloha broadcastu nahraná na Telegram jen jednou.
+
+    První odeslání použije handle z client.upload_file, další příjemci dostanou
+    dokument/fotku z první odeslané zprávy – bez dalšího uploadu.
+    """
+
+    def __init__(self, client, source, file_name: Optional[str], mime: str, kind: str, attributes=None):
+        self.client = client
+        self.source = source
+        self.file_name = file_name
+        self.mime = mime
+        self.kind = kind
+        self.attributes = attributes
+        self.uploads = 0
+        self._handle = None
+        self._media = None
+        self._lock = asyncio.Lock()
+
+    def _send_kwargs(self):
+        if self.kind == "photo":
+            return {"supports_streaming": True, "force_document": False}
+        if self.kind == "video":
+            return {"attributes": self.attributes, "mime_type": self.mime, "force_document": False}
+        return {"force_document": True, "mime_type": self.mime or None}
+
+    async def _upload(self):
+        if hasattr(self.source, "seek"):
+            self.source.seek(0)
+        self._handle = await self.client.upload_file(self.source, file_name=self.file_name)
+        self.uploads += 1
+
+    async def _send_media(self, peer, media):
+        try:
+            return await self.client.send_file(peer, media, caption=None, **self._send_kwargs())
+        except FileReferenceExpiredError:
+            # file_reference časem vyprší, pošle se znovu přes nahraný handle a vezme se nový;
+            # mezitím už ho mohl obnovit jiný odesílatel
+            if self._media is media:
+                self._media = None
+            return None
+
+    async def send(self, peer):
+        if self._media is not None:
+            message = await self._send_media(peer, self._media)
+            if message is not None:
+                return message
+
+        # první odeslání serializuje zámek, aby souběžní odesílatelé nenahrávali totéž
+        async with self._lock:
+            if self._media is not None:
+                message = await self._send_media(peer, self._media)
+                if message is not None:
+                    return message
+            if self._handle is None:
+                await self._upload()
+            message = await self.client.send_file(peer, self._handle, caption=None, **self._send_kwargs())
+            self._media = message.photo or message.document
+            return message
+
+async def prepare_broadcast_media(client, path: Optional[str], file_name: Optional[str], mime: Optional[str], allow_photo: bool = True,
+                                 content_hash: Optional[str] = None) -> Optional[BroadcastMedia]:
+    """Připraví přílohu uloženou na disku; metadata videa se čtou jen jednou (cache podle hashe obsahu)."""
+    if not path:
+        return None
+
+    mime = mime or ""
+    if mime.startswith("image/") and allow_photo:
+        return BroadcastMedia(client, path, file_name, mime, "photo")
+
+    if mime.startswith("video/"):
+        w, h, duration = await asyncio.to_thread(get_video_metadata, path, content_hash) or VIDEO_FALLBACK
+        attributes = [DocumentAttributeVideo(duration=duration, w=w, h=h, supports_streaming=True)]
+        return BroadcastMedia(client, path, file_name or "video.mp4", mime, "video", attributes)
+
+    return BroadcastMedia(client, path, file_name, mime, "document")
@@ -0,0 +1,79 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+# AIMD: po úspěchu rychlost roste o krok, po FloodWait se násobí koeficientem
+BROADCAST_RATE_START = float(os.getenv("BROADCAST_RATE_START", "1"))
+BROADCAST_RATE_MIN = float(os.getenv("BROADCAST_RATE_MIN", "0.05"))
+BROADCAST_RATE_MAX = float(os.getenv("BROADCAST_RATE_MAX", "5"))
+BROADCAST_RATE_STEP = float(os.getenv("BROADCAST_RATE_STEP", "0.05"))
+BROADCAST_RATE_BACKOFF = float(os.getenv("BROADCAST_RATE_BACKOFF", "0.5"))
+
+_pacers = {}
+
+class AccountPacer:
+    """Tempo requestů jednoho Telegram účtu sdílené všemi souběžnými odesílateli."""
+
+    def __init__(self, rate: float = BROADCAST_RATE_START):
+        self.rate = rate
+        self.paused_until = 0.0
+        self.next_at = 0.0
+        self.requests = 0
+        self.flood_waits = 0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        # zámek drží frontu čekajících v pořadí; pauza se může prodloužit i během čekání
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                ready_at = max(self.paused_until, self.next_at)
+                if ready_at <= now:
+                    break
+                await asyncio.sleep(ready_at - now)
+            self.next_at = time.monotonic() + 1 / self.rate
+            self.requests += 1
+
+    async def wait_resumed(self):
+        while self.paused:
+            await asyncio.sleep(self.paused_until - time.monotonic())
+
+    def success(self):
+        self.rate = min(BROADCAST_RATE_MAX, self.rate + BROADCAST_RATE_STEP)
+
+    def flood(self, seconds: int):
+        """FloodWait platí pro celý účet: pozastaví všechny odesílatele a zpomalí tempo."""
+        self.flood_waits += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.rate = max(BROADCAST_RATE_MIN, self.rate * BROADCAST_RATE_BACKOFF)
+        logger.warning(f"⏳ FloodWait {seconds}s, účet pozastaven, nové tempo {self.rate:.2f} req/s")
+
+    @property
+    def paused(self) -> bool:
+        return self.paused_until > time.monotonic()
+
+def session_key(session: str) -> str:
+    """Stabilní klíč účtu pro cache a stav v DB, aniž by se ukládala session samotná."""
+    return hashlib.sha256(session.encode()).hexdigest()[:32]
+
+def get_pacer(session: str) -> AccountPacer:
+    # naučené tempo tak přežije i další joby stejného účtu
+    key = session_key(session)
+    pacer = _pacers.get(key)
+    if pacer is None:
+        pacer = _pacers[key] = AccountPacer()
+    return pacer
+
+def get_pacer_stats():
+    return {
+        key: {"rate": round(pacer.rate, 3), "paused": pacer.paused, "requests": pacer.requests, "flood_waits": pacer.flood_waits}
+        for key, pacer in _pacers.items()
+    }
+
+register_collector("broadcast_pacing", get_pacer_stats)
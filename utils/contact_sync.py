@@ -0,0 +1,157 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError
+from telethon.tl.functions.contacts import GetContactsRequest, AddContactRequest
+from telethon.tl.types import InputUser
+from telethon.tl.types.contacts import ContactsNotModified
+
+from database import AsyncSessionLocal
+from crud.aio.broadcast import get_contact_sync, save_contact_sync
+from utils.broadcast_pacer import AccountPacer, session_key
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+CONTACT_SYNC_CONCURRENCY = int(os.getenv("CONTACT_SYNC_CONCURRENCY", "4"))
+CONTACT_SYNC_MAX_FLOOD_RETRIES = int(os.getenv("CONTACT_SYNC_MAX_FLOOD_RETRIES", "3"))
+# po tolika odmítnutích (ne FloodWait) se člověk už nepřidává, zprávy ale dostává dál
+CONTACT_SYNC_MAX_IMPORT_ATTEMPTS = int(os.getenv("CONTACT_SYNC_MAX_IMPORT_ATTEMPTS", "3"))
+# sloupce broadcast_recipients, které se berou z kontaktu
+RECIPIENT_FIELDS = ("user_id", "access_hash", "first_name", "username")
+
+_MASK = (1 << 64) - 1
+_stats = {"syncs": 0, "contacts_cached": 0, "dialogs_scanned": 0, "imported": 0, "import_failed": 0, "pending": 0}
+
+def contacts_hash(saved_count: int, user_ids) -> int:
+    """Hash pro contacts.getContacts (saved_count + seřazená id), se shodným hashem server vrátí ContactsNotModified."""
+    value = 0
+    for item in [saved_count, *sorted(user_ids)[:100000]]:
+        value ^= value >> 21
+        value ^= (value << 35) & _MASK
+        value ^= value >> 4
+        value = (value + item) & _MASK
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def _contact(user) -> Dict[str, Any]:
+    return {
+        "user_id": user.id,
+        "access_hash": user.access_hash,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "username": user.username,
+        "bot": bool(user.bot),
+    }
+
+async def _fetch_contacts(client: TelegramClient, state):
+    """Kontakty ze serveru, nebo z uloženého stavu, když se od minula nezměnily."""
+    result = await client(GetContactsRequest(hash=(state.contacts_hash or 0) if state else 0))
+    if isinstance(result, ContactsNotModified):
+        _stats["contacts_cached"] += 1
+        return list(state.contacts), state.saved_count
+    return [_contact(user) for user in result.users], result.saved_count
+
+async def _new_dialog_users(client: TelegramClient, me_id: int, contact_ids, synced_at: Optional[datetime]):
+    """Uživatelé z dialogů, kteří nejsou v kontaktech; dialogy se procházejí jen po poslední sync."""
+    users = []
+    newest = synced_at
+    async for dialog in client.iter_dialogs():
+        _stats["dialogs_scanned"] += 1
+        if synced_at and dialog.date and dialog.date <= synced_at:
+            # dialogy jdou od nejnovější aktivity, připnuté jsou ale vždy na začátku
+            if dialog.pinned:
+                continue
+            break
+        if dialog.date and (newest is None or dialog.date > newest):
+            newest = dialog.date
+        if dialog.is_user and dialog.entity.id != me_id and dialog.entity.id not in contact_ids:
+            users.append(dialog.entity)
+    return users, newest
+
+async def _import_contacts(client: TelegramClient, pacer: AccountPacer, users: List[Dict[str, Any]]):
+    """Přidá lidi do kontaktů; vrátí (přidaní, nepřidaní) – nepřidaní se uloží a zkusí při další sync."""
+    semaphore = asyncio.Semaphore(CONTACT_SYNC_CONCURRENCY)
+    imported = []
+    failed = []
+
+    async def add(user):
+        attempts = user.get("import_attempts", 0)
+        if attempts >= CONTACT_SYNC_MAX_IMPORT_ATTEMPTS:
+            failed.append(user)
+            return
+        async with semaphore:
+            for _ in range(CONTACT_SYNC_MAX_FLOOD_RETRIES + 1):
+                await pacer.wait()
+                try:
+                    await client(AddContactRequest(
+                        id=InputUser(user["user_id"], user["access_hash"]),
+                        first_name=user["first_name"] or "NoName",
+                        last_name=user.get("last_name") or "",
+                        phone="",
+                        add_phone_privacy_exception=False
+                    ))
+                    pacer.success()
+                    imported.append({key: value for key, value in user.items() if key != "import_attempts"})
+                    _stats["imported"] += 1
+                    return
+                except FloodWaitError as e:
+                    pacer.flood(e.seconds)
+                except Exception as e:
+                    logger.warning(f"⚠️ Kontakt {user['user_id']} se nepodařilo přidat: {e}")
+                    attempts += 1
+                    break
+            _stats["import_failed"] += 1
+            failed.append({**user, "import_attempts": attempts})
+
+    await asyncio.gather(*(add(user) for user in users))
+    return imported, failed
+
+async def sync_contacts(client: TelegramClient, session: str, pacer: AccountPacer, mode: str):
+    """Inkrementální sync kontaktů před broadcastem.
+
+    Vrátí (příjemci, import), kde import je korutina přidávající nové lidi do kontaktů –
+    volající ji spustí až po uložení příjemců.
+    """
+    key = session_key(session)
+    async with AsyncSessionLocal() as db:
+        state = await get_contact_sync(db, key)
+
+    me = await client.get_me()
+    contacts, saved_count = await _fetch_contacts(client, state)
+    contact_ids = {contact["user_id"] for contact in contacts}
+    # neúspěšně přidaní z minula; kdo se mezitím dostal do kontaktů, už nečeká
+    pending = [user for user in (state.pending if state else []) if user["user_id"] not in contact_ids]
+    known_ids = contact_ids | {user["user_id"] for user in pending}
+    new_users, dialogs_synced_at = await _new_dialog_users(client, me.id, known_ids, state.dialogs_synced_at if state else None)
+    _stats["syncs"] += 1
+
+    outside = pending + [_contact(user) for user in new_users]
+    # "new" = jen lidé z dialogů, kteří ještě nejsou v kontaktech (nově nalezení i nepřidaní z minula)
+    users = outside if mode == "new" else contacts + outside
+    recipients = [
+        {field: user.get(field) for field in RECIPIENT_FIELDS}
+        for user in users if not user["bot"] and user["access_hash"] and user["user_id"] != me.id
+    ]
+
+    async def import_new():
+        imported, failed = await _import_contacts(client, pacer, outside)
+        synced = contacts + imported
+        ids = [contact["user_id"] for contact in synced]
+        async with AsyncSessionLocal() as db:
+            await save_contact_sync(db, key, synced, saved_count, contacts_hash(saved_count, ids), dialogs_synced_at, failed)
+        _stats["pending"] = len(failed)
+        logger.info(
+            f"📇 Kontakty synchronizovány: {len(contacts)} v cache, {len(imported)}/{len(outside)} přidáno, "
+            f"{len(failed)} čeká na další pokus"
+        )
+
+    return recipients, import_new
+
+def get_contact_sync_stats():
+    return dict(_stats)
+
+register_collector("contact_sync", get_contact_sync_stats)
@@ -0,0 +1,171 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from database import SessionLocal, AsyncSessionLocal, async_engine
+from crud.aio.bot import get_bot_snapshot
+from crud.aio.outbox import claim_outbox_batch, mark_outbox_sent, mark_outbox_failed
+from crud.outbox import get_outbox_depth
+from utils import telegram_api
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+DISPATCH_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "30"))
+DISPATCH_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+DISPATCH_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+DISPATCH_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+# okno pro propustnost odesílání (zpráv/s)
+DISPATCH_RATE_WINDOW = float(os.getenv("OUTBOX_RATE_WINDOW", "60"))
+# rate limity v utils/rate_limit.py jsou v paměti procesu: odesílat smí jen jeden proces (držitel zámku),
+# jinak by každý uvicorn worker dostal celý limit bota a chatu znovu
+DISPATCH_LOCK_KEY = 724_118_003
+DISPATCH_STANDBY_INTERVAL = float(os.getenv("OUTBOX_STANDBY_INTERVAL", "5"))
+
+_stats = {"sent": 0, "failed": 0, "retried": 0, "last_batch": 0, "active": False}
+# (monotonic čas dokončení dávky, odesláno)
+_sent_log = deque()
+_task = None
+
+async def _claim_batch():
+    async with AsyncSessionLocal() as db:
+        messages = await claim_outbox_batch(db, DISPATCH_BATCH_SIZE, DISPATCH_LEASE_SECONDS)
+        tokens = {}
+        for bot_id in {message.bot_id for message in messages}:
+            bot, status = await get_bot_snapshot(db, bot_id)
+            tokens[bot_id] = bot.api_token if status == 200 else None
+        return messages, tokens
+
+async def _finish_batch(sent_ids, failures):
+    async with AsyncSessionLocal() as db:
+        await mark_outbox_sent(db, sent_ids)
+        for message_id, error, retry_at in failures:
+            await mark_outbox_failed(db, message_id, error, retry_at)
+
+def _retry_at(attempts: int, error: telegram_api.TelegramAPIError):
+    # 400/403 (zablokovaný bot, neexistující chat) se opakováním nespraví
+    if error.status_code in (400, 401, 403, 404) or attempts >= DISPATCH_MAX_ATTEMPTS:
+        return None
+    return datetime.now(timezone.utc) + timedelta(seconds=min(2 ** attempts * 5, 600))
+
+async def dispatch_batch() -> int:
+    messages, tokens = await _claim_batch()
+    if not messages:
+        return 0
+
+    semaphore = asyncio.Semaphore(DISPATCH_CONCURRENCY)
+    sent_ids = []
+    failures = []
+
+    async def send(message):
+        token = tokens.get(message.bot_id)
+        if not token:
+            failures.append((message.id, "Bot nenalezen", None))
+            return
+        async with semaphore:
+            try:
+                await telegram_api.send_message(
+                    token,
+                    message.chat_id,
+                    message.text,
+                    reply_markup=message.reply_markup,
+                    parse_mode=message.parse_mode,
+                )
+                sent_ids.append(message.id)
+            except telegram_api.TelegramAPIError as e:
+                failures.append((message.id, str(e), _retry_at(message.attempts, e)))
+
+    await asyncio.gather(*(send(message) for message in messages))
+    await _finish_batch(sent_ids, failures)
+
+    _stats["sent"] += len(sent_ids)
+    _stats["failed"] += sum(1 for failure in failures if failure[2] is None)
+    _stats["retried"] += sum(1 for failure in failures if failure[2] is not None)
+    _stats["last_batch"] = len(messages)
+    if sent_ids:
+        _sent_log.append((time.monotonic(), len(sent_ids)))
+    return len(messages)
+
+def get_dispatch_throughput() -> float:
+    horizon = time.monotonic() - DISPATCH_RATE_WINDOW
+    while _sent_log and _sent_log[0][0] < horizon:
+        _sent_log.popleft()
+    return round(sum(count for _, count in _sent_log) / DISPATCH_RATE_WINDOW, 2)
+
+async def _dispatch_loop(lock_connection):
+    while True:
+        # zámek drží spojení; když spadne, SELECT 1 selže a o zámek se soutěží znovu
+        await lock_connection.execute(text("SELECT 1"))
+        try:
+            if await dispatch_batch():
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Chyba v dispatcheru outboxu: {e}")
+        await asyncio.sleep(DISPATCH_POLL_INTERVAL)
+
+async def run_dispatcher():
+    logger.info("📤 Spouštím dispatcher outboxu")
+    standby_logged = False
+    while True:
+        try:
+            async with async_engine.connect() as lock_connection:
+                # autocommit, aby spojení se zámkem nedrželo otevřenou transakci
+                await lock_connection.execution_options(isolation_level="AUTOCOMMIT")
+                locked = (await lock_connection.execute(
+                    text("SELECT pg_try_advisory_lock(:key)"), {"key": DISPATCH_LOCK_KEY}
+                )).scalar()
+                if locked:
+                    logger.info("📤 Dispatcher outboxu odesílá z tohoto procesu")
+                    _stats["active"] = True
+                    standby_logged = False
+                    try:
+                        await _dispatch_loop(lock_connection)
+                    finally:
+                        _stats["active"] = False
+                        await lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": DISPATCH_LOCK_KEY})
+                elif not standby_logged:
+                    logger.info("⏸️ Outbox odesílá jiný proces, dispatcher čeká v záloze")
+                    standby_logged = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Chyba zámku dispatcheru outboxu: {e}")
+        await asyncio.sleep(DISPATCH_STANDBY_INTERVAL)
+
+def start_dispatcher():
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.get_running_loop().create_task(run_dispatcher())
+
+async def stop_dispatcher():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+def get_dispatcher_stats():
+    db = SessionLocal()
+    try:
+        depth = get_outbox_depth(db)
+    finally:
+        db.close()
+    return {
+        **_stats,
+        "throughput": get_dispatch_throughput(),
+        "pending": depth.get("pending", 0),
+        "sending": depth.get("sending", 0),
+    }
+
+register_collector("outbox", get_dispatcher_stats)
@@ -0,0 +1,83 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from crud.bot import get_bot_snapshot
+from crud.user import iter_audience, level_up_markup
+from crud.vars import render_message
+from crud.outbox import enqueue_messages, get_delivery_stats
+from models.bot import Sequence
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+FANOUT_CHUNK_SIZE = int(os.getenv("SEQUENCE_FANOUT_CHUNK_SIZE", "500"))
+
+# zařazení posledních běhů pro /api/admin/metrics; doručenost se dotahuje z outboxu
+_last_runs = OrderedDict()
+
+def sequence_run_key(sequence: Sequence) -> str:
+    # běh sekvence je identifikovaný jejím send_at, opakované zpracování po pádu tak nic nezdvojí
+    return f"seq:{sequence.id}:{sequence.send_at.isoformat() if sequence.send_at else 'now'}"
+
+def get_sequence_delivery(db: Session, sequence_id: UUID, run_key: Optional[str] = None):
+    """Odeslané/selhané zprávy sekvence (všech běhů, nebo jednoho podle run_key) a propustnost odesílání."""
+    return get_delivery_stats(db, f"{run_key or f'seq:{sequence_id}'}:")
+
+def fan_out_sequence(db: Session, sequence: Sequence):
+    """Zařadí sekvenci do outboxu pro celé publikum: bot se načte jednou, publikum po dávkách."""
+    run_key = sequence_run_key(sequence)
+    stats = {"sequence_id": str(sequence.id), "run_key": run_key, "total": 0, "queued": 0, "duplicates": 0, "enqueue_duration": 0.0}
+
+    bot, status = get_bot_snapshot(db, sequence.bot_id)
+    if status != 200:
+        logger.error(f"❌ Bot {sequence.bot_id} pro sekvenci {sequence.id} nenalezen")
+        return stats
+
+    bot_id, message, check_status = sequence.bot_id, sequence.message, sequence.check_status
+    started = time.monotonic()
+
+    for users in iter_audience(db, bot_id, sequence.levels, FANOUT_CHUNK_SIZE):
+        rows = [
+            {
+                "bot_id": bot_id,
+                "chat_id": user.chat_id,
+                "text": render_message(bot, user, message),
+                "reply_markup": level_up_markup(bot.lang, user.id) if check_status else None,
+                "dedup_key": f"{run_key}:{user.id}",
+            }
+            for user in users
+        ]
+        queued = enqueue_messages(db, rows)
+        db.commit()
+
+        stats["total"] += len(users)
+        stats["queued"] += queued
+        stats["duplicates"] += len(users) - queued
+
+    stats["enqueue_duration"] = round(time.monotonic() - started, 2)
+
+    _last_runs[stats["sequence_id"]] = stats
+    if len(_last_runs) > 50:
+        _last_runs.popitem(last=False)
+
+    logger.info(
+        f"📨 Sekvence {sequence.id}: zařazeno {stats['queued']}/{stats['total']}, "
+        f"duplicit {stats['duplicates']} za {stats['enqueue_duration']} s"
+    )
+    return stats
+
+def get_sequence_stats():
+    db = SessionLocal()
+    try:
+        return [{**run, **get_sequence_delivery(db, run["sequence_id"], run["run_key"])} for run in _last_runs.values()]
+    finally:
+        db.close()
+
+register_collector("sequences", get_sequence_stats)
@@ -0,0 +1,23 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Hashable, Optional
+
+# round-robin odkazů počítá v celých číslech (share * LINK_SHARE_SCALE), float akumulátory by se rozjížděly
+LINK_SHARE_SCALE = 1000
+
+def scaled_share(share: Optional[float]) -> int:
+    # zaokrouhlení jako round(share::numeric * scale) v PostgreSQL
+    return int((Decimal(repr(share or 0)) * LINK_SHARE_SCALE).quantize(Decimal(1), ROUND_HALF_UP))
+
+def pick_link(current: Dict[Hashable, int], shares: Dict[Hashable, float]) -> Optional[Hashable]:
+    """Jeden krok smooth weighted round-robin nad current (mění ho); stejná aritmetika jako crud/aio/links.ALLOCATE_LINK."""
+    weights = {key: scaled_share(share) for key, share in shares.items()}
+    weights = {key: weight for key, weight in weights.items() if weight > 0}
+    if not weights:
+        return None
+    total = sum(weights.values())
+    for key, weight in weights.items():
+        current[key] = current.get(key, 0) + weight
+    # remíza jako v SQL: ORDER BY bumped DESC, id
+    picked = min(weights, key=lambda key: (-current[key], key))
+    current[picked] -= total
+    return picked
@@ -1,31 +1,179 @@
 import json
 import os
+import re
+import threading
+import logging
 from uuid import UUID
 
-def get_messages(level: int, lang: str, is_event: bool, bot_id: UUID):
-    event_path = "event/" if is_event else "online/"
+logger = logging.getLogger(__name__)
+
+TRACES_DIR = "data/traces"
+CUSTOMS_DIR = "data/customs"
 
-    custom_path = f"data/customs/{bot_id}/level-{level}.json"
-    sequences_path = f"data/traces/{lang}/{event_path}level-{level}.json"
+LEVEL_FILE_RE = re.compile(r"^level-(\d+)\.json$")
 
-    if os.path.exists(custom_path):
-        path = custom_path
-    elif os.path.exists(sequences_path):
-        path = sequences_path
-    else:
-        raise FileNotFoundError(f"Nenalezen ani {custom_path}, ani {sequences_path}")
+# Katalog se načítá jednou za proces, lookup zprávy pak nesahá na disk
+_catalog = None
+_catalog_lock = threading.Lock()
 
+def _read_json(path: str):
     with open(path, "r", encoding="utf-8") as file:
-        data = json.load(file)
+        return json.load(file)
 
-    return data.get("messages", [])
+def _index_messages(messages: list):
+    by_id = {}
+    for message in messages:
+        # stejně jako původní next(...) vyhrává první zpráva s daným id
+        by_id.setdefault(message.get("id"), message)
+    return {"messages": messages, "by_id": by_id}
 
-def get_message(is_dynamic: bool, lang: str):
-    path = f"data/traces/{lang}/stakings.json"
+def _catalog_files():
+    # (cesta, sekce katalogu, klíč v sekci) pro každý soubor, který katalog drží
+    files = []
 
-    with open(path, "r", encoding="utf-8") as file:
-        data = json.load(file)
-    
-    messages = data.get("messages", {})
+    if os.path.isdir(TRACES_DIR):
+        for lang in os.listdir(TRACES_DIR):
+            lang_dir = os.path.join(TRACES_DIR, lang)
+            if not os.path.isdir(lang_dir):
+                continue
+            for kind in ("online", "event"):
+                kind_dir = os.path.join(lang_dir, kind)
+                if not os.path.isdir(kind_dir):
+                    continue
+                for filename in os.listdir(kind_dir):
+                    match = LEVEL_FILE_RE.match(filename)
+                    if match:
+                        files.append((os.path.join(kind_dir, filename), "traces", (lang, kind, int(match.group(1)))))
+
+            stakings_path = os.path.join(lang_dir, "stakings.json")
+            if os.path.exists(stakings_path):
+                files.append((stakings_path, "stakings", lang))
+
+    if os.path.isdir(CUSTOMS_DIR):
+        for bot_id in os.listdir(CUSTOMS_DIR):
+            bot_dir = os.path.join(CUSTOMS_DIR, bot_id)
+            if not os.path.isdir(bot_dir):
+                continue
+            for filename in os.listdir(bot_dir):
+                match = LEVEL_FILE_RE.match(filename)
+                if match:
+                    files.append((os.path.join(bot_dir, filename), "customs", (bot_id, int(match.group(1)))))
+
+    return files
+
+def _parse_file(path: str, section: str):
+    data = _read_json(path)
+    if section == "stakings":
+        return data.get("messages", {})
+    return _index_messages(data.get("messages", []))
+
+def _scan_mtimes():
+    mtimes = {}
+    for path, section, key in _catalog_files():
+        try:
+            mtimes[path] = (os.stat(path).st_mtime_ns, section, key)
+        except FileNotFoundError:
+            continue
+    return mtimes
+
+def load_catalog(version: int = 1):
+    catalog = {"version": version, "traces": {}, "customs": {}, "stakings": {}, "files": {}}
+
+    for path, (mtime, section, key) in _scan_mtimes().items():
+        catalog[section][key] = _parse_file(path, section)
+        catalog["files"][path] = (mtime, section, key)
+
+    return catalog
+
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = load_catalog()
+    return _catalog
+
+def reload_catalog():
+    global _catalog
+    with _catalog_lock:
+        version = _catalog["version"] + 1 if _catalog else 1
+        _catalog = load_catalog(version)
+    return _catalog["version"]
+
+def refresh_catalog():
+    """Přenačte jen soubory, kterým se změnilo mtime, a atomicky vymění katalog."""
+    global _catalog
+    get_catalog()
+
+    with _catalog_lock:
+        current = _catalog
+        mtimes = _scan_mtimes()
+
+        changed = [path for path, entry in mtimes.items() if current["files"].get(path, (None,))[0] != entry[0]]
+        removed = [path for path in current["files"] if path not in mtimes]
+        if not changed and not removed:
+            return []
+
+        catalog = {
+            "version": current["version"] + 1,
+            "traces": dict(current["traces"]),
+            "customs": dict(current["customs"]),
+            "stakings": dict(current["stakings"]),
+            "files": dict(current["files"]),
+        }
+
+        for path in removed:
+            mtime, section, key = catalog["files"].pop(path)
+            catalog[section].pop(key, None)
+
+        reloaded = []
+        for path in changed:
+            mtime, section, key = mtimes[path]
+            try:
+                catalog[section][key] = _parse_file(path, section)
+            except (OSError, ValueError) as e:
+                # rozepsaný nebo nevalidní JSON necháme na další kolo, stará verze zůstává
+                logger.warning(f"⚠️ Nepodařilo se načíst {path}: {e}")
+                continue
+            catalog["files"][path] = (mtime, section, key)
+            reloaded.append(path)
+
+        if not reloaded and not removed:
+            return []
+        _catalog = catalog
+
+    logger.info(f"🔄 Katalog tras přenačten (verze {catalog['version']}): {reloaded + removed}")
+    return reloaded + removed
+
+def get_catalog_info():
+    catalog = get_catalog()
+    return {
+        "version": catalog["version"],
+        "files": len(catalog["files"]),
+        "traces": len(catalog["traces"]),
+        "customs": len(catalog["customs"]),
+    }
+
+def get_trace(level: int, lang: str, is_event: bool, bot_id: UUID):
+    catalog = get_catalog()
+    kind = "event" if is_event else "online"
+
+    trace = catalog["customs"].get((str(bot_id), level)) or catalog["traces"].get((lang, kind, level))
+    if trace is None:
+        raise FileNotFoundError(
+            f"Nenalezen ani {CUSTOMS_DIR}/{bot_id}/level-{level}.json, ani {TRACES_DIR}/{lang}/{kind}/level-{level}.json"
+        )
+    return trace
+
+def get_messages(level: int, lang: str, is_event: bool, bot_id: UUID):
+    return get_trace(level, lang, is_event, bot_id)["messages"]
+
+def get_trace_message(level: int, lang: str, is_event: bool, bot_id: UUID, message_id: int):
+    return get_trace(level, lang, is_event, bot_id)["by_id"].get(message_id)
+
+def get_message(is_dynamic: bool, lang: str):
+    messages = get_catalog()["stakings"].get(lang)
+    if messages is None:
+        raise FileNotFoundError(f"Nenalezen {TRACES_DIR}/{lang}/stakings.json")
 
-    return messages.get("dynamic" if is_dynamic else "conservative", "")
\ No newline at end of file
+    return messages.get("dynamic" if is_dynamic else "conservative", "")
@@ -0,0 +1,20 @@
+import logging
+from typing import Callable, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# jednoduchý registr: každý subsystém dodá funkci, která vrátí svůj aktuální stav
+_collectors: Dict[str, Callable[[], Any]] = {}
+
+def register_collector(name: str, collector: Callable[[], Any]):
+    _collectors[name] = collector
+
+def collect() -> Dict[str, Any]:
+    snapshot = {}
+    for name, collector in _collectors.items():
+        try:
+            snapshot[name] = collector()
+        except Exception as e:
+            logger.error(f"❌ Metriky {name} selhaly: {e}")
+            snapshot[name] = None
+    return snapshot
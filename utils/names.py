@@ -0,0 +1,59 @@
+import os
+import logging
+from functools import lru_cache
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+NAME_CACHE_SIZE = int(os.getenv("NAME_CACHE_SIZE", "50000"))
+
+def get_user_name(n):
+    # vokativ se načítá až s prvním skloňovaným jménem
+    from vokativ import sex, vokativ
+
+    if sex(n) == "w":
+        return vokativ(n, woman=True)
+    return vokativ(n, woman=False)
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def _vocative(name: str) -> str:
+    declined = get_user_name(name)
+    return declined[0].upper() + declined[1:] if declined else declined
+
+def get_vocative_name(name: str):
+    """Oslovení v 5. pádě s velkým písmenem, sdílená LRU cache podle jména."""
+    if not name:
+        return name
+    return _vocative(name.strip())
+
+def get_name_cache_stats():
+    info = _vocative.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+register_collector("name_cache", get_name_cache_stats)
+
+def warm_name_cache(db: Session):
+    from models.user import User
+    from models.bot import Bot
+
+    names = (
+        db.query(User.name)
+        .join(Bot, Bot.id == User.bot_id)
+        .filter(Bot.lang.in_(("cs", "sk")), User.name.isnot(None))
+        .group_by(User.name)
+        .order_by(func.count().desc())
+        .limit(NAME_CACHE_SIZE)
+        .all()
+    )
+
+    for (name,) in names:
+        try:
+            get_vocative_name(name)
+        except Exception:
+            continue
+
+    logger.info(f"🔥 Cache oslovení předehřátá: {len(names)} jmen")
+    return len(names)
@@ -0,0 +1,128 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+# limity Telegramu: ~30 zpráv/s na bota, ~1 zpráva/s do jednoho chatu
+# stav bucketů je v paměti procesu; sendMessage volá jen dispatcher outboxu, který běží
+# v jediném procesu naráz (advisory zámek v utils/dispatcher.py)
+BOT_RATE = float(os.getenv("TELEGRAM_BOT_RATE", "30"))
+BOT_BURST = int(os.getenv("TELEGRAM_BOT_BURST", "30"))
+CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "1"))
+MAX_CHAT_BUCKETS = int(os.getenv("TELEGRAM_MAX_CHAT_BUCKETS", "100000"))
+
+class TokenBucket:
+    """Token bucket ve formě GCRA – drží jen teoretický čas příštího odeslání."""
+
+    def __init__(self, rate: float, burst: int):
+        self.interval = 1.0 / rate
+        self.tolerance = self.interval * (burst - 1)
+        self.tat = 0.0
+        self.paused_until = 0.0
+
+    def earliest(self, now: float) -> float:
+        return max(now, self.tat - self.tolerance, self.paused_until)
+
+    def consume(self, at: float):
+        self.tat = max(self.tat, at) + self.interval
+
+    def pause(self, until: float):
+        self.paused_until = max(self.paused_until, until)
+
+class BotStats:
+    def __init__(self):
+        self.sent = 0
+        self.throttled = 0
+        self.waiting = 0
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.rate = 0.0
+
+    def record(self, now: float):
+        self.sent += 1
+        if now - self.window_start >= 1.0:
+            self.rate = self.window_count / (now - self.window_start)
+            self.window_start = now
+            self.window_count = 0
+        self.window_count += 1
+
+_bot_buckets = {}
+_chat_buckets = OrderedDict()
+_stats = {}
+
+def _bot_key(token: str) -> str:
+    # číselné id bota z tokenu, aby se token nedostal do metrik
+    return token.split(":", 1)[0]
+
+def _get_buckets(token: str, chat_id: int):
+    key = _bot_key(token)
+    bot_bucket = _bot_buckets.get(key)
+    if bot_bucket is None:
+        bot_bucket = _bot_buckets[key] = TokenBucket(BOT_RATE, BOT_BURST)
+        _stats[key] = BotStats()
+
+    chat_key = (key, chat_id)
+    chat_bucket = _chat_buckets.get(chat_key)
+    if chat_bucket is None:
+        chat_bucket = _chat_buckets[chat_key] = TokenBucket(CHAT_RATE, CHAT_BURST)
+        if len(_chat_buckets) > MAX_CHAT_BUCKETS:
+            _chat_buckets.popitem(last=False)
+    else:
+        _chat_buckets.move_to_end(chat_key)
+
+    return bot_bucket, chat_bucket, _stats[key]
+
+async def acquire(token: str, chat_id: int):
+    """Počká na volný slot pro bota i chat. Rezervace probíhá bez await, takže je v event loopu atomická."""
+    bot_bucket, chat_bucket, stats = _get_buckets(token, chat_id)
+
+    now = time.monotonic()
+    at = max(bot_bucket.earliest(now), chat_bucket.earliest(now))
+    bot_bucket.consume(at)
+    chat_bucket.consume(at)
+
+    stats.waiting += 1
+    try:
+        while at > now:
+            await asyncio.sleep(at - now)
+            # mezitím mohl přijít 429 a bot je pozastavený
+            now = time.monotonic()
+            at = bot_bucket.paused_until
+    finally:
+        stats.waiting -= 1
+
+    stats.record(time.monotonic())
+
+def pause(token: str, seconds: float):
+    """Po 429 s retry_after pozastaví všechna odeslání daného bota."""
+    key = _bot_key(token)
+    bucket = _bot_buckets.get(key)
+    if bucket is None:
+        return
+    bucket.pause(time.monotonic() + seconds)
+    _stats[key].throttled += 1
+    logger.warning(f"⏳ Bot {key} dostal 429, pauza {seconds}s")
+
+def get_rate_limit_stats():
+    now = time.monotonic()
+    return {
+        "bots": {
+            key: {
+                "sent": stats.sent,
+                "throttled": stats.throttled,
+                "queue_depth": stats.waiting,
+                "rate": round(stats.rate, 2),
+                "paused_for": round(max(0.0, _bot_buckets[key].paused_until - now), 2),
+            }
+            for key, stats in _stats.items()
+        },
+        "chat_buckets": len(_chat_buckets),
+    }
+
+register_collector("rate_limit", get_rate_limit_stats)
@@ -0,0 +1,81 @@
+# python -m utils.startup [modul] – kolik stojí import aplikace a které moduly ho brzdí
+
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+from contextlib import contextmanager
+from typing import List, NamedTuple
+
+from utils.metrics import register_collector
+
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "2000"))
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# fáze startup hooku -> trvání v ms
+_phases = {}
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+@contextmanager
+def startup_phase(name: str):
+    """Změří jednu fázi startu, výsledek je v metrikách pod "startup"."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases[name] = round((time.perf_counter() - started) * 1000, 1)
+
+def get_startup_stats():
+    return dict(_phases)
+
+register_collector("startup", get_startup_stats)
+
+def profile_imports(module: str = "main") -> List[ImportTiming]:
+    """Import modulu v čistém interpretu s -X importtime (cache modulů z tohoto procesu se nepočítá)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.getcwd(),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"import {module} selhal")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings.append(ImportTiming(name, int(self_us) / 1000, int(cumulative_us) / 1000, len(indent) // 2))
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profil aplikace")
+    parser.add_argument("module", nargs="?", default="main")
+    parser.add_argument("--top", type=int, default=20, help="kolik nejdražších modulů vypsat")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_IMPORT_BUDGET_MS, help="limit celkového importu")
+    args = parser.parse_args()
+
+    timings = profile_imports(args.module)
+    total = next(timing for timing in reversed(timings) if timing.module == args.module)
+
+    # přímé importy aplikace (depth 1) podle kumulativního času, pak nejdražší moduly samy o sobě
+    print(f"{'kumulativně':>12} {'sám':>9}  modul")
+    for timing in sorted((t for t in timings if t.depth == 1), key=lambda t: t.cumulative_ms, reverse=True)[:args.top]:
+        print(f"{timing.cumulative_ms:>9.1f} ms {timing.self_ms:>6.1f} ms  {timing.module}")
+    print()
+    for timing in sorted(timings, key=lambda t: t.self_ms, reverse=True)[:args.top]:
+        print(f"{'':>12} {timing.self_ms:>6.1f} ms  {timing.module}")
+
+    within = total.cumulative_ms <= args.budget_ms
+    print(f"\n{'✅' if within else '❌'} import {args.module}: {total.cumulative_ms:.0f} ms (limit {args.budget_ms:.0f} ms)")
+    sys.exit(0 if within else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import os
+import logging
+from typing import Optional, Any, Dict
+
+import httpx
+
+from utils import rate_limit
+
+logger = logging.getLogger(__name__)
+
+# přepsatelné kvůli lokálnímu fake Bot API serveru
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", "10"))
+TELEGRAM_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_MAX_CONNECTIONS", "100"))
+TELEGRAM_MAX_KEEPALIVE = int(os.getenv("TELEGRAM_MAX_KEEPALIVE", "20"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "5"))
+
+class TelegramAPIError(Exception):
+    def __init__(self, method: str, status_code: Optional[int], description: str, retry_after: Optional[int] = None):
+        super().__init__(f"{method} selhal ({status_code}): {description}")
+        self.method = method
+        self.status_code = status_code
+        self.description = description
+        self.retry_after = retry_after
+
+_client: Optional[httpx.AsyncClient] = None
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=TELEGRAM_API_URL,
+            timeout=httpx.Timeout(TELEGRAM_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=TELEGRAM_MAX_CONNECTIONS,
+                max_keepalive_connections=TELEGRAM_MAX_KEEPALIVE,
+                keepalive_expiry=60.0,
+            ),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def call(token: str, method: str, payload: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+    try:
+        response = await get_client().post(
+            f"/bot{token}/{method}",
+            json=payload or {},
+            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+        )
+    except httpx.HTTPError as e:
+        raise TelegramAPIError(method, None, str(e)) from e
+
+    try:
+        data = response.json()
+    except ValueError:
+        raise TelegramAPIError(method, response.status_code, response.text)
+
+    if response.status_code != 200 or not data.get("ok"):
+        parameters = data.get("parameters") or {}
+        raise TelegramAPIError(
+            method,
+            response.status_code,
+            data.get("description", response.text),
+            retry_after=parameters.get("retry_after"),
+        )
+
+    return data.get("result")
+
+async def send_message(
+    token: str,
+    chat_id: int,
+    text: str,
+    reply_markup: Optional[Dict[str, Any]] = None,
+    parse_mode: Optional[str] = "html",
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    payload = {"chat_id": chat_id, "text": text}
+    if parse_mode:
+        payload["parse_mode"] = parse_mode
+    if reply_markup:
+        payload["reply_markup"] = reply_markup
+
+    for attempt in range(TELEGRAM_MAX_RETRIES):
+        await rate_limit.acquire(token, chat_id)
+        try:
+            return await call(token, "sendMessage", payload, timeout=timeout)
+        except TelegramAPIError as e:
+            # 429 neznamená chybu, jen přeplánování po retry_after
+            if e.status_code != 429 or attempt == TELEGRAM_MAX_RETRIES - 1:
+                raise
+            rate_limit.pause(token, e.retry_after or 1)
+
+async def get_me(token: str) -> Dict[str, Any]:
+    return await call(token, "getMe")
+
+async def set_webhook(token: str, url: str) -> bool:
+    return await call(token, "setWebhook", {"url": url})
+
+async def delete_webhook(token: str) -> bool:
+    return await call(token, "deleteWebhook")
+
+async def get_webhook_info(token: str) -> Dict[str, Any]:
+    return await call(token, "getWebhookInfo")
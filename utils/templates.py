@@ -0,0 +1,28 @@
+import re
+from functools import lru_cache
+
+PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+@lru_cache(maxsize=4096)
+def compile_template(message: str):
+    """Rozloží zprávu na dvojice (literál, proměnná) a koncový literál, <br> převede už tady."""
+    segments = []
+    position = 0
+    for match in PLACEHOLDER_RE.finditer(message):
+        segments.append((message[position:match.start()].replace("<br>", "\n"), match.group(1)))
+        position = match.end()
+
+    return tuple(segments), message[position:].replace("<br>", "\n")
+
+def render(template, context: dict) -> str:
+    segments, tail = template
+    parts = []
+    for literal, key in segments:
+        parts.append(literal)
+        # neznámé proměnné (např. {url} u eventů) necháváme v textu beze změny
+        parts.append(context[key] if key in context else f"{{{key}}}")
+    parts.append(tail)
+    return "".join(parts)
+
+def render_template(message: str, context: dict) -> str:
+    return render(compile_template(message), context)
@@ -0,0 +1,84 @@
+import os
+import threading
+import logging
+
+from utils.messages import TRACES_DIR, CUSTOMS_DIR, refresh_catalog
+
+logger = logging.getLogger(__name__)
+
+TRACE_WATCH_INTERVAL = float(os.getenv("TRACE_WATCH_INTERVAL", "2"))
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+_watcher_thread = None
+_stop_event = threading.Event()
+
+def _watched_dirs():
+    dirs = []
+    for root in (TRACES_DIR, CUSTOMS_DIR):
+        for path, subdirs, files in os.walk(root):
+            dirs.append(path)
+    return dirs
+
+def _run_inotify():
+    inotify = INotify()
+    mask = (
+        inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO | inotify_flags.MOVED_FROM
+        | inotify_flags.CREATE | inotify_flags.DELETE
+    )
+    watched = set()
+
+    def watch_new_dirs():
+        # nové složky (např. customs nového bota) hlásí CREATE v rodiči, pak se přidají
+        for path in _watched_dirs():
+            if path not in watched:
+                try:
+                    inotify.add_watch(path, mask)
+                    watched.add(path)
+                except OSError:
+                    continue
+
+    watch_new_dirs()
+    while not _stop_event.is_set():
+        # timeout jen kvůli kontrole _stop_event, bez událostí se nic neprochází
+        if inotify.read(timeout=int(TRACE_WATCH_INTERVAL * 1000)):
+            # editory zapisují ve více krocích, chvíli počkáme na dokončení
+            _stop_event.wait(0.2)
+            inotify.read(timeout=0)
+            watch_new_dirs()
+            _refresh()
+
+def _run_polling():
+    while not _stop_event.wait(TRACE_WATCH_INTERVAL):
+        _refresh()
+
+def _refresh():
+    try:
+        refresh_catalog()
+    except Exception as e:
+        logger.error(f"❌ Chyba při přenačítání katalogu tras: {e}")
+
+def _run():
+    if INotify is not None:
+        try:
+            _run_inotify()
+            return
+        except OSError as e:
+            logger.warning(f"⚠️ inotify není k dispozici ({e}), přepínám na polling mtime.")
+    _run_polling()
+
+def start_trace_watcher():
+    global _watcher_thread
+    if _watcher_thread and _watcher_thread.is_alive():
+        return
+
+    _stop_event.clear()
+    _watcher_thread = threading.Thread(target=_run, name="trace-watcher", daemon=True)
+    _watcher_thread.start()
+    logger.info(f"👀 Sleduji změny tras ({'inotify' if INotify else 'polling'}, {TRACE_WATCH_INTERVAL}s)")
+
+def stop_trace_watcher():
+    _stop_event.set()
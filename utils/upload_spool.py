@@ -0,0 +1,150 @@
+import os
+import asyncio
+import hashlib
+import logging
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from python_multipart import MultipartParser
+from python_multipart.multipart import parse_options_header
+
+logger = logging.getLogger(__name__)
+
+# textová pole formuláře (session, zpráva) se drží v paměti, soubor jde rovnou na disk
+UPLOAD_MAX_FIELD_BYTES = int(os.getenv("UPLOAD_MAX_FIELD_BYTES", str(1024 * 1024)))
+
+class UploadError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class SpooledUpload(NamedTuple):
+    path: str
+    file_name: Optional[str]
+    content_type: Optional[str]
+    size: int
+    # sha256 obsahu, počítá se při zápisu (cache metadat videa)
+    sha256: str
+
+class _Part:
+    def __init__(self):
+        self.headers = {}
+        self.name = None
+        self.file_name = None
+        self.data = bytearray()
+        self.is_file = False
+
+class _SpoolParser:
+    """Callbacky python-multipart; data souboru se jen sbírají, zápis dělá async smyčka."""
+
+    def __init__(self):
+        self.part = _Part()
+        self.header_name = b""
+        self.header_value = b""
+        self.fields = {}
+        self.file_part = None
+        self.file_chunks = []
+
+    def on_part_begin(self):
+        self.part = _Part()
+
+    def on_header_field(self, data, start, end):
+        self.header_name += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.part.headers[self.header_name.lower()] = self.header_value
+        self.header_name = b""
+        self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.part.headers.get(b"content-disposition"))
+        if b"name" not in options:
+            raise UploadError(400, "Chybí jméno pole ve formuláři")
+        self.part.name = options[b"name"].decode("utf-8", "replace")
+        if b"filename" in options:
+            if self.file_part is not None:
+                raise UploadError(400, "Broadcast podporuje jen jednu přílohu")
+            self.part.is_file = True
+            self.part.file_name = options[b"filename"].decode("utf-8", "replace")
+            self.file_part = self.part
+
+    def on_part_data(self, data, start, end):
+        if self.part.is_file:
+            self.file_chunks.append(data[start:end])
+            return
+        if len(self.part.data) + end - start > UPLOAD_MAX_FIELD_BYTES:
+            raise UploadError(413, f"Pole {self.part.name} je příliš velké")
+        self.part.data.extend(data[start:end])
+
+    def on_part_end(self):
+        if not self.part.is_file:
+            self.fields[self.part.name] = self.part.data.decode("utf-8", "replace")
+
+async def spool_multipart(request, path_for: Callable[[Optional[str]], str], max_bytes: int) -> Tuple[Dict[str, str], Optional[SpooledUpload]]:
+    """Přečte multipart/form-data po kouscích; přílohu zapíše jednou přímo do souboru z path_for(jméno).
+
+    Paměť drží jen aktuální chunk requestu a textová pole. Při chybě nebo přerušeném
+    uploadu se rozepsaný soubor smaže.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError(415, "Očekávám multipart/form-data")
+
+    state = _SpoolParser()
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": state.on_part_begin,
+        "on_header_field": state.on_header_field,
+        "on_header_value": state.on_header_value,
+        "on_header_end": state.on_header_end,
+        "on_headers_finished": state.on_headers_finished,
+        "on_part_data": state.on_part_data,
+        "on_part_end": state.on_part_end,
+    })
+
+    spooled = None
+    path = None
+    size = 0
+    digest = hashlib.sha256()
+
+    def write(data: bytes):
+        spooled.write(data)
+        digest.update(data)
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if not state.file_chunks:
+                continue
+            if spooled is None:
+                path = path_for(state.file_part.file_name)
+                spooled = open(path, "wb")
+            data = b"".join(state.file_chunks)
+            state.file_chunks.clear()
+            size += len(data)
+            if size > max_bytes:
+                raise UploadError(413, f"Příloha je větší než {max_bytes // (1024 * 1024)} MB")
+            # zápis na disk i hash mimo event loop
+            await asyncio.to_thread(write, data)
+        parser.finalize()
+    except BaseException:
+        if spooled is not None:
+            spooled.close()
+            os.remove(path)
+        raise
+
+    if spooled is None:
+        return state.fields, None
+    spooled.close()
+
+    part = state.file_part
+    content_type = part.headers.get(b"content-type")
+    return state.fields, SpooledUpload(
+        path=path,
+        file_name=part.file_name,
+        content_type=content_type.decode("latin-1") if content_type else None,
+        size=size,
+        sha256=digest.hexdigest(),
+    )
@@ -0,0 +1,170 @@
+import os
+import json
+import shutil
+import struct
+import logging
+import subprocess
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+VIDEO_PROBE_CACHE_SIZE = int(os.getenv("VIDEO_PROBE_CACHE_SIZE", "256"))
+VIDEO_PROBE_FFPROBE_TIMEOUT = float(os.getenv("VIDEO_PROBE_FFPROBE_TIMEOUT", "15"))
+
+class VideoMetadata(NamedTuple):
+    width: int
+    height: int
+    duration: float
+
+# sha256 obsahu -> VideoMetadata, nejdéle nepoužité se zahazují
+_cache = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "mp4": 0, "ffprobe": 0, "opencv": 0, "failed": 0}
+
+def _boxes(f, start: int, end: int):
+    """Hlavičky boxů (typ, začátek dat, konec) mezi start a end; obsah se nečte."""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield kind, offset + header, min(offset + size, end)
+        offset += size
+
+def _mvhd_duration(data: bytes) -> Optional[float]:
+    if data[0] == 1:
+        timescale, duration = struct.unpack(">IQ", data[20:32])
+    else:
+        timescale, duration = struct.unpack(">II", data[12:20])
+    return duration / timescale if timescale else None
+
+def _tkhd_size(data: bytes):
+    # za časy a id stopy: rezervováno, layer, skupina, hlasitost, matice 3x3, šířka a výška v 16.16
+    base = 96 if data[0] == 1 else 84
+    a, b = struct.unpack(">ii", data[base - 44:base - 36])
+    width, height = struct.unpack(">II", data[base - 8:base])
+    width, height = width >> 16, height >> 16
+    # otočené video (mobil na výšku) má v matici a = d = 0, zobrazí se s prohozenými rozměry
+    if a == 0 and b != 0:
+        width, height = height, width
+    return width, height
+
+def _track_size(f, start: int, end: int):
+    """(šířka, výška, handler) jedné stopy z trak/tkhd a trak/mdia/hdlr."""
+    size = None
+    handler = None
+    for kind, data_start, data_end in _boxes(f, start, end):
+        if kind == b"tkhd":
+            f.seek(data_start)
+            size = _tkhd_size(f.read(96))
+        elif kind == b"mdia":
+            for sub, sub_start, _ in _boxes(f, data_start, data_end):
+                if sub == b"hdlr":
+                    # verze+flags, pre_defined, pak typ handleru
+                    f.seek(sub_start + 8)
+                    handler = f.read(4)
+    return size, handler
+
+def probe_mp4(path: str) -> Optional[VideoMetadata]:
+    """Rozměry a délka z boxů moov/mvhd/tkhd; čte se jen pár kB bez ohledu na velikost souboru."""
+    duration = None
+    sizes = []
+    with open(path, "rb") as f:
+        # moov bývá i za mdat (nahrávky z mobilu), mdat se přeskočí podle velikosti
+        for kind, data_start, data_end in _boxes(f, 0, os.fstat(f.fileno()).st_size):
+            if kind != b"moov":
+                continue
+            for sub, sub_start, sub_end in _boxes(f, data_start, data_end):
+                if sub == b"mvhd":
+                    f.seek(sub_start)
+                    duration = _mvhd_duration(f.read(32))
+                elif sub == b"trak":
+                    size, handler = _track_size(f, sub_start, sub_end)
+                    if size and size[0] and size[1]:
+                        sizes.append((handler == b"vide", size))
+            break
+
+    if duration is None or not sizes:
+        return None
+    # přednost má stopa s handlerem "vide", audio stopy mají rozměry 0
+    _, (width, height) = max(sizes, key=lambda item: item[0])
+    return VideoMetadata(width, height, round(duration, 3))
+
+def probe_ffprobe(path: str) -> Optional[VideoMetadata]:
+    executable = shutil.which("ffprobe")
+    if not executable:
+        return None
+    result = subprocess.run(
+        [executable, "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=width,height:stream_side_data=rotation:format=duration", "-of", "json", path],
+        capture_output=True, timeout=VIDEO_PROBE_FFPROBE_TIMEOUT, check=True,
+    )
+    info = json.loads(result.stdout)
+    stream = info["streams"][0]
+    width, height = int(stream["width"]), int(stream["height"])
+    rotation = next((int(side.get("rotation", 0)) for side in stream.get("side_data_list", [])), 0)
+    if rotation % 180:
+        width, height = height, width
+    return VideoMetadata(width, height, round(float(info["format"]["duration"]), 3))
+
+def probe_opencv(path: str) -> Optional[VideoMetadata]:
+    # OpenCV je volitelné a těžké, importuje se jen když ostatní backendy selžou
+    try:
+        import cv2
+    except ImportError:
+        return None
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return None
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25
+        return VideoMetadata(
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            round(cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps, 3),
+        )
+    finally:
+        cap.release()
+
+PROBES = (("mp4", probe_mp4), ("ffprobe", probe_ffprobe), ("opencv", probe_opencv))
+
+def get_video_metadata(path: str, content_hash: Optional[str] = None) -> Optional[VideoMetadata]:
+    """Metadata videa (šířka, výška, délka); se známým hashem obsahu se soubor zkoumá jen jednou."""
+    if content_hash and content_hash in _cache:
+        _cache.move_to_end(content_hash)
+        _stats["hits"] += 1
+        return _cache[content_hash]
+    _stats["misses"] += 1
+
+    for name, probe in PROBES:
+        try:
+            metadata = probe(path)
+        except Exception as e:
+            logger.debug(f"Probe {name} pro {path} selhal: {e}")
+            continue
+        if metadata:
+            _stats[name] += 1
+            break
+    else:
+        _stats["failed"] += 1
+        return None
+
+    if content_hash:
+        _cache[content_hash] = metadata
+        while len(_cache) > VIDEO_PROBE_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return metadata
+
+def get_video_probe_stats():
+    return {**_stats, "cached": len(_cache)}
+
+register_collector("video_probe", get_video_probe_stats)
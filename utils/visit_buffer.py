@@ -0,0 +1,128 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy.dialects.postgresql import insert
+
+from database import AsyncSessionLocal
+from crud.aio.bot import get_bot_by_name
+from models.bot import AnalyticData
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+VISIT_FLUSH_INTERVAL_MS = int(os.getenv("VISIT_FLUSH_INTERVAL_MS", "500"))
+VISIT_FLUSH_MAX_EVENTS = int(os.getenv("VISIT_FLUSH_MAX_EVENTS", "1000"))
+# při výpadku DB se buffer nesmí rozrůst donekonečna, nejstarší návštěvy se zahodí
+VISIT_BUFFER_MAX = int(os.getenv("VISIT_BUFFER_MAX", "100000"))
+VISIT_SHUTDOWN_TIMEOUT = float(os.getenv("VISIT_SHUTDOWN_TIMEOUT", "5"))
+VISIT_NAME_TTL = float(os.getenv("VISIT_NAME_TTL", "60"))
+VISIT_NAME_CACHE_MAX = 10000
+
+_buffer = deque()
+_bot_ids = {}
+_flush_needed: Optional[asyncio.Event] = None
+_task = None
+_stats = {"recorded": 0, "flushed": 0, "batches": 0, "dropped": 0, "errors": 0, "flush_last": 0.0, "flush_max": 0.0}
+
+async def resolve_bot_id(bot_name: str) -> Optional[UUID]:
+    """Id bota podle jména nebo event_name; cachuje se i neexistující jméno."""
+    cached = _bot_ids.get(bot_name)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    async with AsyncSessionLocal() as db:
+        db_bot, status = await get_bot_by_name(db, bot_name)
+    bot_id = db_bot.id if status == 200 else None
+    # náhodná jména z internetu nesmí cache nafouknout
+    if len(_bot_ids) >= VISIT_NAME_CACHE_MAX:
+        _bot_ids.clear()
+    _bot_ids[bot_name] = (time.monotonic() + VISIT_NAME_TTL, bot_id)
+    return bot_id
+
+def record_visit(bot_id: UUID):
+    _buffer.append({"id": uuid.uuid4(), "bot_id": bot_id, "created_at": datetime.now(timezone.utc)})
+    _stats["recorded"] += 1
+    if len(_buffer) > VISIT_BUFFER_MAX:
+        _buffer.popleft()
+        _stats["dropped"] += 1
+    if len(_buffer) >= VISIT_FLUSH_MAX_EVENTS and _flush_needed is not None:
+        _flush_needed.set()
+
+async def flush_visits() -> int:
+    if not _buffer:
+        return 0
+
+    batch = [_buffer.popleft() for _ in range(min(len(_buffer), VISIT_FLUSH_MAX_EVENTS))]
+    started = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as db:
+            # id se generuje při záznamu, opakovaný zápis stejné dávky je tak neškodný
+            await db.execute(insert(AnalyticData).values(batch).on_conflict_do_nothing(index_elements=["id"]))
+            await db.commit()
+    except BaseException as e:
+        # vrátit na začátek (i při zrušení tasku), další flush to zkusí znovu
+        _buffer.extendleft(reversed(batch))
+        if not isinstance(e, asyncio.CancelledError):
+            _stats["errors"] += 1
+        raise
+    finally:
+        _stats["flush_last"] = time.perf_counter() - started
+        _stats["flush_max"] = max(_stats["flush_max"], _stats["flush_last"])
+
+    _stats["flushed"] += len(batch)
+    _stats["batches"] += 1
+    return len(batch)
+
+async def _run():
+    while True:
+        try:
+            await asyncio.wait_for(_flush_needed.wait(), VISIT_FLUSH_INTERVAL_MS / 1000)
+        except asyncio.TimeoutError:
+            pass
+        _flush_needed.clear()
+        try:
+            while await flush_visits() == VISIT_FLUSH_MAX_EVENTS:
+                pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Zápis návštěv selhal ({len(_buffer)} čeká): {e}")
+            await asyncio.sleep(1)
+
+def start_visit_buffer():
+    global _task, _flush_needed
+    if _task is None or _task.done():
+        _flush_needed = asyncio.Event()
+        _task = asyncio.get_running_loop().create_task(_run())
+
+async def stop_visit_buffer():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+    # dopsat zbytek, ale vypínání nesmí viset na nedostupné DB
+    try:
+        await asyncio.wait_for(_drain(), VISIT_SHUTDOWN_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"⚠️ Při vypínání nezapsáno {len(_buffer)} návštěv: {e}")
+
+async def _drain():
+    while _buffer:
+        await flush_visits()
+
+def get_visit_buffer_stats():
+    return {**_stats, "pending": len(_buffer), "names_cached": len(_bot_ids)}
+
+register_collector("visits", get_visit_buffer_stats)
@@ -0,0 +1,129 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from uuid import UUID
+
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_DEDUP_SIZE = int(os.getenv("WEBHOOK_DEDUP_SIZE", "20000"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "10"))
+
+Handler = Callable[[UUID, Dict[str, Any]], Awaitable[None]]
+
+_queues = []
+_tasks = []
+_handler: Optional[Handler] = None
+# naposledy viděná (bot_id, update_id), Telegram po timeoutu posílá tentýž update znovu
+_seen = OrderedDict()
+_stats = {
+    "received": 0, "duplicates": 0, "rejected": 0, "processed": 0, "errors": 0,
+    "acks": 0, "ack_total": 0.0, "ack_max": 0.0, "lag_total": 0.0, "lag_max": 0.0,
+}
+
+def _chat_id(update: Dict[str, Any]):
+    if "message" in update:
+        return update["message"].get("chat", {}).get("id")
+    if "callback_query" in update:
+        callback = update["callback_query"]
+        return (callback.get("message") or {}).get("chat", {}).get("id") or callback.get("from", {}).get("id")
+    return None
+
+def _shard(bot_id: UUID, update: Dict[str, Any]) -> int:
+    # všechny updaty jednoho chatu jdou do stejné fronty, takže se zpracují v pořadí
+    key = _chat_id(update)
+    if key is None:
+        key = update.get("update_id", 0)
+    return hash((bot_id, key)) % len(_queues)
+
+def enqueue_update(bot_id: UUID, update: Dict[str, Any]) -> bool:
+    """Zařadí update ke zpracování. False = plná fronta nebo neběžící workery (Telegram to zkusí znovu)."""
+    if not _queues:
+        _stats["rejected"] += 1
+        return False
+
+    update_id = update.get("update_id")
+    dedup_key = (bot_id, update_id)
+    if update_id is not None and dedup_key in _seen:
+        _stats["duplicates"] += 1
+        return True
+
+    try:
+        _queues[_shard(bot_id, update)].put_nowait((bot_id, update, time.monotonic()))
+    except asyncio.QueueFull:
+        _stats["rejected"] += 1
+        return False
+
+    if update_id is not None:
+        _seen[dedup_key] = None
+        if len(_seen) > WEBHOOK_DEDUP_SIZE:
+            _seen.popitem(last=False)
+    _stats["received"] += 1
+    return True
+
+def record_ack(seconds: float):
+    _stats["acks"] += 1
+    _stats["ack_total"] += seconds
+    _stats["ack_max"] = max(_stats["ack_max"], seconds)
+
+async def _worker(queue: asyncio.Queue):
+    while True:
+        bot_id, update, received_at = await queue.get()
+        lag = time.monotonic() - received_at
+        _stats["lag_total"] += lag
+        _stats["lag_max"] = max(_stats["lag_max"], lag)
+        try:
+            await _handler(bot_id, update)
+            _stats["processed"] += 1
+        except Exception as e:
+            _stats["errors"] += 1
+            logger.error(f"❌ Chyba při zpracování updatu {update.get('update_id')} bota {bot_id}: {e}")
+        finally:
+            queue.task_done()
+
+def start_webhook_workers(handler: Handler):
+    global _handler
+    if _tasks:
+        return
+
+    _handler = handler
+    loop = asyncio.get_running_loop()
+    for index in range(WEBHOOK_WORKERS):
+        queue = asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+        _queues.append(queue)
+        _tasks.append(loop.create_task(_worker(queue), name=f"webhook-worker-{index}"))
+    logger.info(f"📥 Spuštěno {WEBHOOK_WORKERS} workerů pro webhooky")
+
+async def stop_webhook_workers():
+    if not _tasks:
+        return
+
+    # už přijaté updaty Telegram znovu nepošle, proto je zkusíme dozpracovat
+    try:
+        await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in _queues)), WEBHOOK_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"⚠️ Nezpracované webhooky při vypínání: {sum(queue.qsize() for queue in _queues)}")
+
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    _queues.clear()
+
+def get_webhook_stats():
+    started = _stats["processed"] + _stats["errors"]
+    return {
+        **_stats,
+        "depth": sum(queue.qsize() for queue in _queues),
+        "workers": len(_tasks),
+        "ack_avg": round(_stats["ack_total"] / _stats["acks"], 6) if _stats["acks"] else 0.0,
+        "lag_avg": round(_stats["lag_total"] / started, 6) if started else 0.0,
+    }
+
+register_collector("webhooks", get_webhook_stats)